@@ -0,0 +1,139 @@
+"""Several LoRA adapters served over one shared base model.
+
+The workout, diet and rehab variants are LoRA fine-tunes of the same base
+weights, so instead of one process (and one full copy of the base model)
+per variant, `AdapterRegistry` loads every adapter into a single PEFT
+model. Each adapter only adds its low-rank matrices, so memory grows per
+adapter rather than per model.
+
+Only one adapter can be active at a time, so the scheduler groups each
+batch by adapter and runs `activate(name)` around every `generate` call.
+Adapters can be loaded, replaced and unloaded at runtime without touching
+the base weights; callers must do that on the generation thread so no
+batch is running while the model changes.
+
+Adapters are configured as a comma-separated `name=path` list, e.g.
+
+    ADAPTERS="workout=rithesh10/workoutLlama2,diet=/models/diet-lora"
+
+Paths can be Hub repo ids or local directories saved with
+`model.save_pretrained()`. The server's POST/DELETE /adapters endpoints
+need `ADAPTER_ADMIN_TOKEN` and only (re)load entries from this list.
+"""
+import contextlib
+import os
+
+ADAPTERS = os.environ.get("ADAPTERS", "")
+DEFAULT_ADAPTER = os.environ.get("DEFAULT_ADAPTER", "")
+BASE_ADAPTER = "base"  # request name for the bare base model, adapters disabled
+
+
+class UnknownAdapterError(KeyError):
+    """The request named an adapter that is not loaded"""
+
+
+def parse_adapters(spec):
+    """"name=path,name=path" -> {name: path}"""
+    adapters = {}
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        name, _, path = entry.partition("=")
+        if not path:
+            raise ValueError(f"Adapter entry {entry!r} must look like name=path")
+        adapters[name.strip()] = path.strip()
+    return adapters
+
+
+def parameter_bytes(parameters):
+    return sum(parameter.numel() * parameter.element_size() for parameter in parameters)
+
+
+class AdapterRegistry:
+    def __init__(self, model, default=None):
+        self.model = model
+        self.paths = {}
+        # A model loaded from a LoRA repo (e.g. through unsloth) is already a
+        # PEFT model with its adapter(s) attached
+        for name in getattr(model, "peft_config", {}):
+            self.paths[name] = None
+        self.default = default or next(iter(self.paths), None)
+
+    @property
+    def is_peft(self):
+        return hasattr(self.model, "peft_config")
+
+    def names(self):
+        return list(self.paths)
+
+    def resolve(self, name):
+        """Adapter to use for a request; None means the base model"""
+        name = name or self.default
+        if name in (None, BASE_ADAPTER):
+            return None
+        if name not in self.paths:
+            raise UnknownAdapterError(name)
+        return name
+
+    def load(self, name, path):
+        """Attach (or replace) adapter `name`; the base weights are not reloaded"""
+        if name == BASE_ADAPTER:
+            raise ValueError(f"'{BASE_ADAPTER}' is reserved for the base model")
+        if not self.is_peft:
+            from peft import PeftModel
+
+            self.model = PeftModel.from_pretrained(self.model, path, adapter_name=name, is_trainable=False)
+        else:
+            if name in self.paths:
+                # Replace in place: drop the old low-rank weights first
+                self.model.delete_adapter(name)
+            self.model.load_adapter(path, adapter_name=name, is_trainable=False)
+        self.model.eval()
+        self.paths[name] = path
+        if self.default is None:
+            self.default = name
+        return self.model
+
+    def unload(self, name):
+        if name not in self.paths:
+            raise UnknownAdapterError(name)
+        if len(self.paths) == 1:
+            raise ValueError("Cannot unload the last adapter")
+        if self.model.active_adapter == name:
+            self.model.set_adapter(next(other for other in self.paths if other != name))
+        self.model.delete_adapter(name)
+        del self.paths[name]
+        if self.default == name:
+            self.default = next(iter(self.paths))
+
+    @contextlib.contextmanager
+    def activate(self, name):
+        """Run the model with adapter `name` (None = base weights only)"""
+        if name is None:
+            if self.is_peft:
+                with self.model.disable_adapter():
+                    yield
+            else:
+                yield
+            return
+        if name not in self.paths:
+            raise UnknownAdapterError(name)
+        if self.model.active_adapter != name:
+            self.model.set_adapter(name)
+        yield
+
+    def stats(self):
+        named = list(self.model.named_parameters())
+        adapters = {}
+        for name, path in self.paths.items():
+            marker = f".{name}."
+            adapters[name] = {
+                "path": path,
+                "bytes": parameter_bytes(parameter for key, parameter in named if marker in key and "lora_" in key),
+            }
+        return {
+            "default": self.default,
+            "active": self.model.active_adapter if self.is_peft else None,
+            "base_bytes": parameter_bytes(parameter for key, parameter in named if "lora_" not in key),
+            "adapters": adapters,
+        }
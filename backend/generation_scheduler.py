@@ -0,0 +1,487 @@
+"""Dynamic request batching for the workout LLM `/generate` endpoint.
+
+Concurrent prompts are collected for up to `batch_window` seconds (or until
+`max_batch_size` are waiting), left-padded into one batch and run through
+`model.generate` on a worker thread so the event loop never blocks. Each
+caller awaits its own future and gets back only its own decoded text.
+
+`stream()` serves a single prompt token by token (for Server-Sent Events)
+on the same worker thread, and stops generating as soon as the consumer
+goes away.
+
+Admission control keeps tail latency bounded under overload: at most
+`max_queue_size` requests may wait (further ones get `QueueFullError` with
+a Retry-After estimate), and every request may carry a timeout. Expired
+requests are dropped before they reach the model, and a running generation
+stops once every caller in its batch has passed its deadline.
+
+With an `AdapterRegistry`, each request names the LoRA adapter it wants;
+a collected batch is split per adapter and each group runs with its adapter
+active. Cached prefix key/values depend on the adapter weights, so one
+prefix cache is kept per adapter.
+
+Requests may also ask for structured output (`structured_days`): those rows
+are constrained to the plan JSON layout by `PlanLogitsProcessor` while the
+rest of the batch decodes freely. Every row also keeps its own
+`max_new_tokens`: a batch decodes for its largest budget, but each row is
+finished (and padded) once it reaches its own.
+
+Works with any Hugging Face causal LM / tokenizer pair, so it can be
+exercised on CPU with a tiny model, e.g.:
+
+    model = AutoModelForCausalLM.from_pretrained("sshleifer/tiny-gpt2")
+    tokenizer = AutoTokenizer.from_pretrained("sshleifer/tiny-gpt2")
+    scheduler = GenerationScheduler(model, tokenizer, max_new_tokens=16)
+"""
+import asyncio
+import contextlib
+import math
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import torch
+from transformers import LogitsProcessorList, StoppingCriteria, StoppingCriteriaList, TextStreamer
+
+from prefix_cache import PrefixCache
+from structured_output import PlanLogitsProcessor, TokenVocabulary
+
+
+class QueueFullError(Exception):
+    """The scheduler already has `max_queue_size` requests waiting"""
+
+    def __init__(self, retry_after):
+        super().__init__("Generation queue is full")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """The request's timeout passed before its generation finished"""
+
+
+@dataclass
+class PendingRequest:
+    prompt: str
+    future: asyncio.Future
+    deadline: float = None  # time.monotonic() value, None = no deadline
+    max_new_tokens: int = None  # None = scheduler default
+    structured_days: int = None  # constrain output to a plan JSON with this many days
+    adapter: str = None  # resolved LoRA adapter name, None = base model
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+    def expired(self, now):
+        return self.deadline is not None and now >= self.deadline
+
+
+class AsyncTextStreamer(TextStreamer):
+    """TextStreamer that hands decoded text to an asyncio queue instead of stdout"""
+
+    def __init__(self, tokenizer, loop, queue):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.loop = loop
+        self.queue = queue
+
+    def on_finalized_text(self, text, stream_end=False):
+        if text:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+
+    def close(self):
+        # None marks the end of the stream for the consumer
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+
+class CancelGeneration(StoppingCriteria):
+    """Stops model.generate once the cancel event is set"""
+
+    def __init__(self, cancelled):
+        self.cancelled = cancelled
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return self.cancelled.is_set()
+
+
+class DeadlineCriteria(StoppingCriteria):
+    """Stops model.generate once `deadline` (time.monotonic) has passed"""
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return time.monotonic() >= self.deadline
+
+
+class RowTokenLimits(StoppingCriteria):
+    """Finishes each row at its own `max_new_tokens` inside a batch that decodes for the longest one"""
+
+    def __init__(self, prompt_length, limits):
+        self.prompt_length = prompt_length
+        self.limits = torch.tensor(limits)
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return input_ids.shape[1] - self.prompt_length >= self.limits.to(input_ids.device)
+
+
+class GenerationScheduler:
+    def __init__(self, model, tokenizer, max_batch_size=8, batch_window=0.02, max_new_tokens=250,
+                 prefix_cache=None, max_queue_size=64, adapters=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix_cache = prefix_cache  # optional PrefixCache for the shared prompt preamble
+        self.adapters = adapters  # optional AdapterRegistry; prefix_cache was built with its default active
+        self._prefix_caches = {}
+        if prefix_cache is not None:
+            self._prefix_caches[adapters.resolve(None) if adapters else None] = prefix_cache
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.max_new_tokens = max_new_tokens
+        self.max_queue_size = max_queue_size
+
+        # Decoder-only models must be padded on the left for batched generation
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.tokenizer.padding_side = "left"
+
+        self._queue = None
+        self._worker = None
+        self._streams_waiting = 0
+        # A single worker thread: the model runs one batch at a time
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="generate")
+        self._wait_times = deque(maxlen=1000)  # seconds from enqueue to reaching the model
+        self._batch_seconds = None  # moving average of one generate() call
+        self._vocab = None  # TokenVocabulary, built on the first structured request
+        self.stats = {"requests": 0, "batches": 0, "largest_batch": 0, "errors": 0,
+                      "streams": 0, "streams_cancelled": 0, "prefix_tokens_reused": 0, "prefix_mismatches": 0,
+                      "rejected": 0, "timed_out": 0, "expired_in_queue": 0,
+                      "generated_tokens": 0}
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        # Fail anything still waiting so callers don't hang on shutdown
+        while self._queue and not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Generation scheduler stopped"))
+        self._executor.shutdown(wait=False)
+
+    async def warm_up(self, prompt, max_new_tokens=8, batch_sizes=(1,)):
+        """Run short generations so kernels and allocator pools exist before real traffic"""
+        loop = asyncio.get_running_loop()
+        for batch_size in batch_sizes:
+            await loop.run_in_executor(
+                self._executor, self.generate_batch, [prompt] * batch_size, max_new_tokens
+            )
+
+    async def load_adapter(self, name, path):
+        """Attach or replace a LoRA adapter between batches (base weights stay loaded)"""
+        if self.adapters is None:
+            raise RuntimeError("Adapter serving is not enabled")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._swap_adapter, self.adapters.load, name, path)
+
+    async def unload_adapter(self, name):
+        if self.adapters is None:
+            raise RuntimeError("Adapter serving is not enabled")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._swap_adapter, self.adapters.unload, name)
+
+    def _swap_adapter(self, change, name, *args):
+        # Runs on the generation thread, so no batch sees a half-changed model
+        change(name, *args)
+        self.model = self.adapters.model  # the first adapter wraps the base model
+        self._prefix_caches.pop(name, None)
+
+    def resolve_adapter(self, name):
+        """Validate a request's adapter name before it is queued"""
+        return self.adapters.resolve(name) if self.adapters is not None else None
+
+    def queue_depth(self):
+        return (self._queue.qsize() if self._queue else 0) + self._streams_waiting
+
+    def retry_after(self):
+        """Rough seconds until the current queue drains"""
+        batch_seconds = self._batch_seconds or 1.0
+        batches_ahead = self.queue_depth() / self.max_batch_size + 1
+        return max(1, math.ceil(batches_ahead * batch_seconds))
+
+    def _admit(self, count=1):
+        if self._worker is None:
+            raise RuntimeError("Generation scheduler is not running")
+        if self.queue_depth() + count > self.max_queue_size:
+            self.stats["rejected"] += 1
+            raise QueueFullError(self.retry_after())
+
+    async def submit(self, prompt, timeout=None, max_new_tokens=None, structured_days=None, adapter=None):
+        """Queue a formatted prompt and wait for its generated text.
+
+        Raises QueueFullError when the queue is full, DeadlineExceeded when
+        `timeout` seconds pass first and UnknownAdapterError for an adapter
+        that is not loaded.
+        """
+        adapter = self.resolve_adapter(adapter)
+        self._admit()
+        deadline = time.monotonic() + timeout if timeout else None
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(PendingRequest(
+            prompt=prompt, future=future, deadline=deadline,
+            max_new_tokens=max_new_tokens, structured_days=structured_days, adapter=adapter
+        ))
+        self.stats["requests"] += 1
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            raise DeadlineExceeded(f"Generation did not finish within {timeout}s")
+
+    async def submit_many(self, prompts, timeout=None, max_new_tokens=None, adapter=None):
+        """Queue related prompts together so they land in the same batch.
+
+        Admission is all-or-nothing; results come back in prompt order.
+        """
+        adapter = self.resolve_adapter(adapter)
+        self._admit(len(prompts))
+        deadline = time.monotonic() + timeout if timeout else None
+        loop = asyncio.get_running_loop()
+        futures = []
+        for prompt in prompts:
+            future = loop.create_future()
+            self._queue.put_nowait(PendingRequest(
+                prompt=prompt, future=future, deadline=deadline, max_new_tokens=max_new_tokens, adapter=adapter
+            ))
+            futures.append(future)
+        self.stats["requests"] += len(prompts)
+        try:
+            return await asyncio.wait_for(asyncio.gather(*futures), timeout)
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            raise DeadlineExceeded(f"Generation did not finish within {timeout}s")
+
+    def stream(self, prompt, timeout=None, adapter=None):
+        """Async iterator over generated text chunks for one prompt.
+
+        Admission happens here, before iteration starts, so callers can still
+        answer with a 429. The stream counts against the queue bound and is
+        queued for the worker right away, so a burst of streams is bounded like
+        a burst of `submit` calls. Closing the iterator (e.g. the HTTP client
+        disconnected) cancels the generation at the next decoding step.
+        """
+        adapter = self.resolve_adapter(adapter)
+        self._admit()
+        deadline = time.monotonic() + timeout if timeout else None
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancelled = threading.Event()
+        streamer = AsyncTextStreamer(self.tokenizer, loop, queue)
+        enqueued_at = time.monotonic()
+        self._streams_waiting += 1
+
+        def job():
+            loop.call_soon_threadsafe(self._stream_started, enqueued_at)
+            self.generate_streaming(prompt, streamer, cancelled, deadline, adapter)
+
+        future = loop.run_in_executor(self._executor, job)
+        self.stats["streams"] += 1
+        tokens = self._stream_tokens(queue, future, cancelled, deadline)
+        # An iterator dropped before its first step never runs its finally block
+        weakref.finalize(tokens, cancelled.set)
+        return tokens
+
+    async def _stream_tokens(self, queue, future, cancelled, deadline):
+        finished = False
+        try:
+            while True:
+                text = await queue.get()
+                if text is None:
+                    break
+                yield text
+            finished = True
+            await future  # surface any generation error
+            if deadline is not None and time.monotonic() >= deadline:
+                self.stats["timed_out"] += 1
+                raise DeadlineExceeded("Generation stopped at the request deadline")
+        finally:
+            if not finished:
+                self.stats["streams_cancelled"] += 1
+            cancelled.set()
+
+    def _stream_started(self, enqueued_at):
+        self._streams_waiting -= 1
+        self._wait_times.append(time.monotonic() - enqueued_at)
+
+    async def _collect_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # Callers that gave up or ran out of time while queued don't need a slot
+        now = time.monotonic()
+        ready = []
+        for pending in batch:
+            if pending.future.done():
+                continue
+            if pending.expired(now):
+                self.stats["expired_in_queue"] += 1
+                pending.future.set_exception(DeadlineExceeded("Request expired while queued"))
+                continue
+            self._wait_times.append(now - pending.enqueued_at)
+            ready.append(pending)
+        return ready
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            # Only one adapter can be active per generate() call
+            groups = {}
+            for pending in batch:
+                groups.setdefault(pending.adapter, []).append(pending)
+            for adapter, group in groups.items():
+                await self._run_batch(group, adapter)
+
+    async def _run_batch(self, batch, adapter):
+        loop = asyncio.get_running_loop()
+        self.stats["batches"] += 1
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+        # Stop early only once nobody in the batch can still use the result
+        deadlines = [pending.deadline for pending in batch]
+        batch_deadline = None if None in deadlines else max(deadlines)
+        # Each row keeps its own budget; the batch runs as long as the largest one
+        row_tokens = [pending.max_new_tokens or self.max_new_tokens for pending in batch]
+        row_days = [pending.structured_days for pending in batch]
+        started = time.monotonic()
+        try:
+            texts = await loop.run_in_executor(
+                self._executor, self.generate_batch, [pending.prompt for pending in batch],
+                row_tokens, batch_deadline, row_days if any(row_days) else None, adapter
+            )
+        except Exception as e:
+            self.stats["errors"] += 1
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+        finally:
+            elapsed = time.monotonic() - started
+            self._batch_seconds = elapsed if self._batch_seconds is None else 0.8 * self._batch_seconds + 0.2 * elapsed
+
+        for pending, text in zip(batch, texts):
+            if not pending.future.done():
+                pending.future.set_result(text)
+
+    def metrics(self):
+        waits = sorted(self._wait_times)
+
+        def percentile(fraction):
+            return round(waits[min(len(waits) - 1, int(fraction * len(waits)))], 4) if waits else 0.0
+
+        return {
+            "queue_depth": self.queue_depth(),
+            "max_queue_size": self.max_queue_size,
+            "wait_seconds": {
+                "mean": round(sum(waits) / len(waits), 4) if waits else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": round(waits[-1], 4) if waits else 0.0,
+            },
+            "avg_batch_seconds": round(self._batch_seconds, 4) if self._batch_seconds else None,
+            **self.stats,
+        }
+
+    def count_generated(self, output, prompt_length):
+        generated = output[:, prompt_length:]
+        self.stats["generated_tokens"] += int((generated != self.tokenizer.pad_token_id).sum())
+
+    def activate(self, adapter):
+        return self.adapters.activate(adapter) if self.adapters is not None else contextlib.nullcontext()
+
+    def prefix_cache_for(self, adapter):
+        """Prefix key/values computed with `adapter` active (built on first use)"""
+        if self.prefix_cache is None:
+            return None
+        if adapter not in self._prefix_caches:
+            self._prefix_caches[adapter] = PrefixCache(self.model, self.tokenizer, self.prefix_cache.prefix_text)
+        return self._prefix_caches[adapter]
+
+    def model_inputs(self, prompts, adapter=None):
+        """Tokenize prompts, reusing the cached prefix key/values when possible"""
+        if self.prefix_cache is not None and self.prefix_cache.matches(prompts):
+            prefix_cache = self.prefix_cache_for(adapter)
+            inputs = prefix_cache.build_inputs(prompts)
+            if inputs is not None:
+                self.stats["prefix_tokens_reused"] += prefix_cache.prefix_length * len(prompts)
+                return inputs
+            self.stats["prefix_mismatches"] += 1
+        return self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.model.device)
+
+    def generate_batch(self, prompts, max_new_tokens=None, deadline=None, row_days=None, adapter=None):
+        """Blocking batched generation; runs on the worker thread.
+
+        `max_new_tokens` is one limit for every row or a list with one per row.
+        `row_days[i]`, when set, constrains row i to the structured plan layout.
+        """
+        with self.activate(adapter):
+            return self._generate_batch(prompts, max_new_tokens, deadline, row_days, adapter)
+
+    def _generate_batch(self, prompts, max_new_tokens, deadline, row_days, adapter):
+        inputs = self.model_inputs(prompts, adapter)
+        stopping = StoppingCriteriaList([DeadlineCriteria(deadline)] if deadline is not None else [])
+        if isinstance(max_new_tokens, list):
+            if len(set(max_new_tokens)) > 1:
+                stopping.append(RowTokenLimits(inputs["input_ids"].shape[1], max_new_tokens))
+            max_new_tokens = max(max_new_tokens)
+        processors = LogitsProcessorList()
+        if row_days:
+            if self._vocab is None:
+                self._vocab = TokenVocabulary(self.tokenizer)
+            processors.append(PlanLogitsProcessor(self._vocab, row_days))
+        with torch.inference_mode():
+            output = self.model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens or self.max_new_tokens,
+                pad_token_id=self.tokenizer.pad_token_id,
+                stopping_criteria=stopping,
+                logits_processor=processors,
+            )
+        self.count_generated(output, inputs["input_ids"].shape[1])
+        return self.tokenizer.batch_decode(output, skip_special_tokens=True)
+
+    def generate_streaming(self, prompt, streamer, cancelled, deadline=None, adapter=None):
+        """Blocking single-prompt generation that feeds `streamer`"""
+        try:
+            if cancelled.is_set() or (deadline is not None and time.monotonic() >= deadline):
+                return  # consumer left (or ran out of time) while we were queued
+            stopping = [CancelGeneration(cancelled)]
+            if deadline is not None:
+                stopping.append(DeadlineCriteria(deadline))
+            with self.activate(adapter):
+                inputs = self.model_inputs([prompt], adapter)
+                with torch.inference_mode():
+                    output = self.model.generate(
+                        **inputs,
+                        streamer=streamer,
+                        max_new_tokens=self.max_new_tokens,
+                        pad_token_id=self.tokenizer.pad_token_id,
+                        stopping_criteria=StoppingCriteriaList(stopping),
+                    )
+            self.count_generated(output, inputs["input_ids"].shape[1])
+        finally:
+            streamer.close()
@@ -0,0 +1,212 @@
+"""Load and latency benchmark for the workout LLM `/generate` server.
+
+Starts the FastAPI app from workoutfinetuning.py in-process (uvicorn on a
+background thread) with a pluggable backend, waits for `/ready`, then
+drives `/generate` or `/generate/stream` with a fixed number of concurrent
+clients. For each concurrency level it reports requests/sec, generated
+tokens/sec, time-to-first-token and latency percentiles.
+
+The default `stub` backend is deterministic and needs no GPU or model
+download (see stub_model.py), so batching, caching and streaming changes
+can be compared offline:
+
+    python llm_bench.py --concurrency 1,8,32 --requests 200
+    python llm_bench.py --stream --concurrency 16
+    python llm_bench.py --distinct-profiles 0       # every request misses the plan cache
+    python llm_bench.py --backend cpu --model sshleifer/tiny-gpt2
+
+Requires httpx in addition to the server's own dependencies.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import threading
+import time
+
+import httpx
+
+from plan_cache import AGE_BAND, HEIGHT_BUCKET, WEIGHT_BUCKET
+
+GOALS = ["lose weight", "build muscle", "improve endurance"]
+LEVELS = ["beginner", "intermediate", "advanced"]
+# Plan-cache buckets the generated profiles step through (ages 20-65, 152-197 cm, 52-117 kg, 3-7 days)
+AGE_STEPS, HEIGHT_STEPS, WEIGHT_STEPS, DAY_STEPS = 10, 10, 14, 5
+UNIQUE_PROFILES = len(LEVELS) * len(GOALS) * AGE_STEPS * HEIGHT_STEPS * WEIGHT_STEPS * DAY_STEPS
+
+
+def make_queries(count, distinct_profiles, offset=0):
+    """Plan requests; with distinct_profiles=0 every request is a unique profile.
+
+    Profile numbers are spaced one plan-cache bucket apart and enumerated
+    across level, goal, age, height, weight and days, so distinct profiles
+    never share a cache key (up to UNIQUE_PROFILES of them). `offset` shifts
+    the unique profiles, so later concurrency levels don't replay (and hit
+    the plan cache for) the profiles of earlier ones.
+    """
+    queries = []
+    for i in range(offset, offset + count):
+        profile = (i % distinct_profiles if distinct_profiles else i) % UNIQUE_PROFILES
+        level, profile = profile % len(LEVELS), profile // len(LEVELS)
+        goal, profile = profile % len(GOALS), profile // len(GOALS)
+        age, profile = 20 + (profile % AGE_STEPS) * AGE_BAND, profile // AGE_STEPS
+        height, profile = 152 + (profile % HEIGHT_STEPS) * HEIGHT_BUCKET, profile // HEIGHT_STEPS
+        weight, profile = 52 + (profile % WEIGHT_STEPS) * WEIGHT_BUCKET, profile // WEIGHT_STEPS
+        days = 3 + profile
+        queries.append(
+            f"Create a {days}-day workout plan for a {age}-year-old who is {LEVELS[level]} at the gym. "
+            f"The person is {height} cm tall, weighs {weight} kg, and wants to {GOALS[goal]} "
+            f"to reach {weight + (goal - 1) * WEIGHT_BUCKET} kg."
+        )
+    return queries
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(fraction * len(values)))] * 1000, 1)
+
+
+def start_server(port):
+    """Import the app after env is configured and serve it on a daemon thread"""
+    import uvicorn
+
+    server_module = importlib.import_module("workoutfinetuning")
+    server = uvicorn.Server(uvicorn.Config(server_module.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    return server, thread
+
+
+async def wait_ready(client, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            response = await client.get("/ready")
+            if response.status_code == 200:
+                return response.json()
+            if response.json().get("phase") == "failed":
+                raise RuntimeError(f"Server failed to start: {response.json().get('error')}")
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError("Server did not become ready")
+
+
+async def one_request(client, query, stream):
+    start = time.perf_counter()
+    first_token = None
+    if stream:
+        async with client.stream("POST", "/generate/stream", json={"query": query}) as response:
+            status = response.status_code
+            async for line in response.aiter_lines():
+                if line.startswith("data:") and first_token is None:
+                    first_token = time.perf_counter() - start
+                if line.startswith("event: error"):
+                    status = 599
+    else:
+        response = await client.post("/generate", json={"query": query})
+        status = response.status_code
+        if status == 200 and response.json().get("status") != "success":
+            status = 599
+    latency = time.perf_counter() - start
+    return status, latency, first_token if first_token is not None else latency
+
+
+async def run_level(client, queries, concurrency, stream):
+    before = (await client.get("/metrics")).json()
+    pending = iter(queries)
+    results = []
+
+    async def worker():
+        for query in pending:
+            results.append(await one_request(client, query, stream))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    after = (await client.get("/metrics")).json()
+
+    ok = [result for result in results if result[0] == 200]
+    statuses = {}
+    for status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    tokens = after["scheduler"]["generated_tokens"] - before["scheduler"]["generated_tokens"]
+    hits = after["cache"]["hits"] - before["cache"]["hits"]
+    latencies = [latency for _, latency, _ in ok]
+    ttfts = [ttft for _, _, ttft in ok]
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "statuses": statuses,
+        "seconds": round(elapsed, 2),
+        "requests_per_sec": round(len(ok) / elapsed, 2),
+        "tokens_per_sec": round(tokens / elapsed, 1),
+        "cache_hits": hits,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50),
+            "p90": percentile(latencies, 0.90),
+            "p99": percentile(latencies, 0.99),
+            "max": percentile(latencies, 1.0),
+        },
+        "ttft_ms": {
+            "p50": percentile(ttfts, 0.50),
+            "p90": percentile(ttfts, 0.90),
+            "p99": percentile(ttfts, 0.99),
+        },
+        "largest_batch": after["scheduler"]["largest_batch"],
+    }
+
+
+async def run(args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        readiness = await wait_ready(client, args.startup_timeout)
+        report = {
+            "backend": args.backend,
+            "stream": args.stream,
+            "startup": readiness,
+            "levels": [],
+        }
+        for level, concurrency in enumerate(int(level) for level in args.concurrency.split(",")):
+            queries = make_queries(args.requests, args.distinct_profiles, offset=level * args.requests)
+            report["levels"].append(await run_level(client, queries, concurrency, args.stream))
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the /generate server")
+    parser.add_argument("--backend", default="stub", help="stub, cpu or gpu (INFERENCE_BACKEND)")
+    parser.add_argument("--model", help="MODEL_NAME for the cpu backend, e.g. sshleifer/tiny-gpt2")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client counts")
+    parser.add_argument("--requests", type=int, default=100, help="requests per concurrency level")
+    parser.add_argument("--stream", action="store_true", help="use /generate/stream and measure real TTFT")
+    parser.add_argument("--distinct-profiles", type=int, default=0,
+                        help="number of distinct user profiles (0 = all unique, so every request misses the plan cache)")
+    parser.add_argument("--max-new-tokens", type=int, default=250)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    # The server reads its configuration from the environment at import time
+    os.environ["INFERENCE_BACKEND"] = args.backend
+    os.environ["GENERATE_MAX_NEW_TOKENS"] = str(args.max_new_tokens)
+    if args.model:
+        os.environ["MODEL_NAME"] = args.model
+
+    server, _ = start_server(args.port)
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        server.should_exit = True
+
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
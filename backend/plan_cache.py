@@ -0,0 +1,203 @@
+"""Response cache for workout-plan generation.
+
+Most `/generate` requests are the same instruction with slightly different
+numbers ("create a 7-day plan for a 30-year-old beginner, 190 cm, 90 kg,
+goal 80 kg"). `profile_cache_key` parses the profile out of the free text
+and normalizes it into coarse buckets (age band, height/weight buckets,
+goal, level, ...) so near-identical requests share one cache entry. Only
+the numbers are bucketed: the rest of the text (injuries, equipment, the
+kind of plan asked for) stays in the key word for word, so "no equipment,
+bad knee" never shares an entry with the plain request. Requests without a
+recognisable profile fall back to an exact, whitespace/case-normalized
+text key.
+
+`PlanCache` is a thread-safe LRU with a TTL, an entry limit and a byte
+limit, plus hit/miss/eviction counters.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+AGE_BAND = 5        # years
+HEIGHT_BUCKET = 5   # cm
+WEIGHT_BUCKET = 5   # kg
+
+NUMBER = r"(\d{1,3}(?:\.\d+)?)"
+AGE_PATTERNS = [
+    re.compile(NUMBER + r"[\s-]*(?:years?|yrs?)[\s-]*old"),
+    re.compile(r"\bage[sd]?\s*(?:of|is|:)?\s*" + NUMBER),
+]
+HEIGHT_PATTERN = re.compile(NUMBER + r"\s*cm\b")
+WEIGHT_PATTERN = re.compile(r"weigh(?:s|t|ing)?\s*(?:of|is|:)?\s*(?:about|around)?\s*" + NUMBER + r"\s*kg")
+TARGET_PATTERN = re.compile(
+    r"(?:reach|target(?: weight)?|goal(?: weight)?|get to|down to|up to)\s*(?:of|is|:)?\s*(?:about|around)?\s*"
+    + NUMBER + r"\s*kg"
+)
+KG_PATTERN = re.compile(NUMBER + r"\s*kg\b")
+DAYS_PATTERN = re.compile(r"(\d{1,2})[\s-]*days?\b")
+PROFILE_NUMBER_PATTERNS = AGE_PATTERNS + [HEIGHT_PATTERN, WEIGHT_PATTERN, TARGET_PATTERN, KG_PATTERN, DAYS_PATTERN]
+PUNCTUATION = re.compile(r"[^\w\s]+")
+
+GOALS = [
+    ("weight_loss", ("lose weight", "weight loss", "fat loss", "lose fat", "burn fat")),
+    ("muscle_gain", ("muscle gain", "gain muscle", "build muscle", "bulk", "hypertrophy", "gain weight")),
+    ("endurance", ("endurance", "stamina", "cardio fitness")),
+    ("strength", ("strength", "stronger")),
+    ("maintenance", ("maintain", "maintenance", "stay fit", "general fitness")),
+]
+LEVELS = ("beginner", "intermediate", "advanced")
+
+
+def _bucket(value, size):
+    return int(value // size * size) if value is not None else None
+
+
+def _first_number(pattern, text):
+    match = pattern.search(text)
+    return float(match.group(1)) if match else None
+
+
+def parse_profile(text):
+    """Pull the numeric and categorical profile fields out of a plan request"""
+    text = text.lower()
+
+    age = None
+    for pattern in AGE_PATTERNS:
+        age = _first_number(pattern, text)
+        if age is not None:
+            break
+
+    weight = _first_number(WEIGHT_PATTERN, text)
+    target = _first_number(TARGET_PATTERN, text)
+    if weight is None or target is None:
+        # Fall back to "first kg is current weight, second is target"
+        kgs = [float(value) for value in KG_PATTERN.findall(text)]
+        if weight is None and kgs:
+            weight = kgs[0]
+        if target is None and len(kgs) > 1:
+            target = next((kg for kg in kgs if kg != weight), None)
+
+    gender = None
+    if re.search(r"\b(female|woman|girl)\b", text):
+        gender = "female"
+    elif re.search(r"\b(male|man|boy)\b", text):
+        gender = "male"
+
+    goal = next((name for name, phrases in GOALS if any(p in text for p in phrases)), None)
+    if goal is None and weight is not None and target is not None and target != weight:
+        goal = "weight_loss" if target < weight else "muscle_gain"
+
+    days = _first_number(DAYS_PATTERN, text)
+
+    return {
+        "age": age,
+        "gender": gender,
+        "height": _first_number(HEIGHT_PATTERN, text),
+        "weight": weight,
+        "target_weight": target,
+        "goal": goal,
+        "level": next((level for level in LEVELS if level in text), None),
+        "days": int(days) if days is not None else None,
+    }
+
+
+def normalize_profile(profile):
+    """Map a parsed profile onto the coarse buckets used for cache keys"""
+    return {
+        "age": _bucket(profile["age"], AGE_BAND),
+        "gender": profile["gender"],
+        "height": _bucket(profile["height"], HEIGHT_BUCKET),
+        "weight": _bucket(profile["weight"], WEIGHT_BUCKET),
+        "target_weight": _bucket(profile["target_weight"], WEIGHT_BUCKET),
+        "goal": profile["goal"],
+        "level": profile["level"],
+        "days": profile["days"],
+    }
+
+
+def constraint_text(text):
+    """The request minus its profile numbers: lowercased, punctuation and spacing normalized"""
+    text = text.lower()
+    for pattern in PROFILE_NUMBER_PATTERNS:
+        text = pattern.sub(" ", text)
+    return " ".join(PUNCTUATION.sub(" ", text).split())
+
+
+def profile_cache_key(query, input_text=""):
+    text = f"{query}\n{input_text}"
+    profile = parse_profile(text)
+    # Only bucket requests that clearly describe a person; anything else
+    # must match exactly
+    if profile["age"] is None and profile["weight"] is None:
+        return "text:" + " ".join(text.lower().split())
+
+    normalized = normalize_profile(profile)
+    return "profile:" + "|".join(f"{field}={normalized[field]}" for field in sorted(normalized)) + \
+        "|text=" + constraint_text(text)
+
+
+class PlanCache:
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl=24 * 60 * 60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value, size = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,200 @@
+"""Nearest-neighbour retrieval over a library of vetted workout plans.
+
+The exact plan cache only helps when a profile falls into the same buckets
+as an earlier request. `PlanIndex` goes one step further: a precomputed
+library of reviewed plans, each stored under the numeric profile it was
+written for. `/generate` looks the request's profile up first and returns
+the closest stored plan when it is within `tolerance`; only profiles with
+no close match reach `model.generate`.
+
+Categorical fields (goal, level, gender, number of days) and the rest of
+the request text with the profile numbers taken out (injuries, equipment,
+the kind of plan) must match exactly, so each combination is its own
+group and a plan is never handed to a request with other constraints.
+Within a group the numeric fields (age, height, weight, target weight) are
+divided by `FEATURE_SCALES`, which makes one unit of distance "one step"
+on every axis, and the nearest entry is found with a single vectorized
+distance computation. A few thousand entries per group answer well over a thousand
+lookups per second on one CPU core.
+
+Build the index offline from a JSONL file of vetted plans (one
+{"query", "input_text", "plan"} object per line), then point
+PLAN_INDEX_PATH at the result:
+
+    python plan_index.py build --source vetted_plans.jsonl --out plan_index.npz
+    python plan_index.py bench --index plan_index.npz --lookups 100000
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+import numpy as np
+
+from plan_cache import constraint_text, parse_profile
+
+NUMERIC_FIELDS = ("age", "height", "weight", "target_weight")
+GROUP_FIELDS = ("goal", "level", "gender", "days")
+# One unit of distance: 5 years, 5 cm, 3 kg current weight, 3 kg target weight
+FEATURE_SCALES = np.array([5.0, 5.0, 3.0, 3.0], dtype=np.float32)
+DEFAULT_TOLERANCE = 1.0
+
+
+def profile_vector(profile):
+    """Scaled numeric vector for a parsed profile, or None if a field is missing"""
+    values = [profile.get(field) for field in NUMERIC_FIELDS]
+    if any(value is None for value in values):
+        return None
+    return np.asarray(values, dtype=np.float32) / FEATURE_SCALES
+
+
+def profile_group(profile, text):
+    """Exact-match part of the key: categorical fields plus the non-numeric request text"""
+    return "|".join([str(profile.get(field)) for field in GROUP_FIELDS] + [constraint_text(text)])
+
+
+class PlanIndex:
+    def __init__(self, groups, vectors, plans, tolerance=DEFAULT_TOLERANCE):
+        """`groups[i]`, `vectors[i]` (scaled) and `plans[i]` describe entry i"""
+        self.tolerance = tolerance
+        self.plans = list(plans)
+        self._groups = {}
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(self.plans), len(NUMERIC_FIELDS))
+        members = {}
+        for row, group in enumerate(groups):
+            members.setdefault(group, []).append(row)
+        for group, rows in members.items():
+            rows = np.array(rows, dtype=np.int64)
+            self._groups[group] = (vectors[rows], rows)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.plans)
+
+    def nearest(self, profile, text):
+        """(plan index, distance) of the closest entry in the request's group, or None"""
+        vector = profile_vector(profile)
+        entry = self._groups.get(profile_group(profile, text))
+        if vector is None or entry is None:
+            return None
+        vectors, rows = entry
+        distances = np.sqrt(((vectors - vector) ** 2).sum(axis=1))
+        best = int(distances.argmin())
+        return int(rows[best]), float(distances[best])
+
+    def lookup(self, query, input_text=""):
+        """(plan, distance) when a stored plan is within tolerance, else None"""
+        text = f"{query}\n{input_text}"
+        match = self.nearest(parse_profile(text), text)
+        with self._lock:
+            if match is None or match[1] > self.tolerance:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return self.plans[match[0]], match[1]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.plans),
+                "groups": len(self._groups),
+                "tolerance": self.tolerance,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def save(self, path):
+        groups = [""] * len(self.plans)
+        vectors = np.zeros((len(self.plans), len(NUMERIC_FIELDS)), dtype=np.float32)
+        for group, (group_vectors, rows) in self._groups.items():
+            for row, vector in zip(rows, group_vectors):
+                groups[row] = group
+                vectors[row] = vector
+        # Plain string arrays, so loading never needs allow_pickle
+        np.savez_compressed(path, groups=np.array(groups), vectors=vectors, plans=np.array(self.plans))
+
+    @classmethod
+    def load(cls, path, tolerance=DEFAULT_TOLERANCE):
+        with np.load(path) as data:
+            groups = data["groups"].tolist()
+            if any(group.count("|") < len(GROUP_FIELDS) for group in groups):
+                raise ValueError(f"{path} was built without request text in its keys, rebuild it with plan_index.py build")
+            return cls(groups, data["vectors"], data["plans"].tolist(), tolerance)
+
+
+def build_index(records):
+    """Index vetted {"query", "input_text", "plan"} records.
+
+    Records without a complete numeric profile are skipped; of several plans
+    for the same profile and group, the first one wins.
+    """
+    groups, vectors, plans = [], [], []
+    seen = set()
+    skipped = 0
+    for record in records:
+        text = f"{record['query']}\n{record.get('input_text', '')}"
+        profile = parse_profile(text)
+        vector = profile_vector(profile)
+        plan = record.get("plan", "").strip()
+        if vector is None or not plan:
+            skipped += 1
+            continue
+        key = (profile_group(profile, text), tuple(vector.tolist()))
+        if key in seen:
+            skipped += 1
+            continue
+        seen.add(key)
+        groups.append(key[0])
+        vectors.append(vector)
+        plans.append(plan)
+    return PlanIndex(groups, np.array(vectors, dtype=np.float32), plans), skipped
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def benchmark(index, lookups=10000, seed=0):
+    """Lookups/sec for random profiles around the indexed ones"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(1000):
+        age, height, weight, target = (rng.randint(18, 65), rng.randint(150, 200),
+                                       rng.randint(50, 120), rng.randint(50, 120))
+        queries.append(
+            f"Create a 7-day workout plan for a {age}-year-old male who is a beginner at the gym. "
+            f"The person is {height} cm tall, weighs {weight} kg, and wants to lose weight to reach {target} kg."
+        )
+    start = time.perf_counter()
+    for i in range(lookups):
+        index.lookup(queries[i % len(queries)])
+    elapsed = time.perf_counter() - start
+    return {"lookups": lookups, "lookups_per_sec": round(lookups / elapsed), **index.stats()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or benchmark the vetted-plan retrieval index")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    build = subcommands.add_parser("build", help="index a JSONL file of vetted plans")
+    build.add_argument("--source", required=True, help='JSONL with {"query", "input_text", "plan"} per line')
+    build.add_argument("--out", required=True, help="output .npz file")
+
+    bench = subcommands.add_parser("bench", help="measure lookups/sec")
+    bench.add_argument("--index", required=True)
+    bench.add_argument("--lookups", type=int, default=10000)
+    bench.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        index, skipped = build_index(read_records(args.source))
+        index.save(args.out)
+        print(json.dumps({"entries": len(index), "skipped": skipped, "out": args.out}))
+    else:
+        print(json.dumps(benchmark(PlanIndex.load(args.index, args.tolerance), args.lookups), indent=2))
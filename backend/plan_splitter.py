@@ -0,0 +1,81 @@
+"""Per-day plan mode for `/generate`.
+
+Instead of one long sequential decode for a whole week (slow, and cut off
+by `max_new_tokens`), the request is split into one sub-prompt per day.
+Every sub-prompt carries the full original request as shared profile
+context plus the day number and its muscle-group focus, so the days can be
+generated together as a single batch and assembled afterwards.
+"""
+import re
+
+from plan_cache import parse_profile
+
+DEFAULT_DAYS = 7
+MAX_DAYS = 14
+
+DAY_FOCUS = [
+    "Chest and triceps",
+    "Back and biceps",
+    "Legs",
+    "Cardio and core",
+    "Shoulders and arms",
+    "Full body",
+    "Active recovery and mobility",
+]
+
+DAY_INSTRUCTION = (
+    "{query}\n\n"
+    "Write only Day {day} of the {days}-day plan. Focus: {focus}. "
+    "List each exercise with sets, reps and rest time."
+)
+
+DAY_HEADER = re.compile(r"^\s*(?:\*\*)?day\s*\d+\s*(?:\([^)]*\))?\s*[:.\-]*(?:\*\*)?\s*", re.IGNORECASE)
+
+
+def plan_days(query, input_text=""):
+    days = parse_profile(f"{query}\n{input_text}")["days"] or DEFAULT_DAYS
+    return max(1, min(days, MAX_DAYS))
+
+
+def build_day_instructions(query, days):
+    """One instruction per day: shared request context + that day's focus"""
+    return [
+        DAY_INSTRUCTION.format(query=query.strip(), day=day, days=days, focus=DAY_FOCUS[(day - 1) % len(DAY_FOCUS)])
+        for day in range(1, days + 1)
+    ]
+
+
+def clean_day_text(text):
+    """Drop a repeated "Day N:" header so assembly controls the numbering"""
+    return DAY_HEADER.sub("", text.strip(), count=1).strip()
+
+
+def day_issues(text):
+    if not text:
+        return ["empty"]
+    if not re.search(r"\d", text):
+        return ["no sets/reps"]
+    return []
+
+
+def assemble_plan(day_texts):
+    """Combine per-day responses into one validated week"""
+    days = []
+    issues = []
+    for day, raw in enumerate(day_texts, start=1):
+        text = clean_day_text(raw)
+        problems = day_issues(text)
+        issues.extend(f"Day {day}: {problem}" for problem in problems)
+        days.append({
+            "day": day,
+            "focus": DAY_FOCUS[(day - 1) % len(DAY_FOCUS)],
+            "text": text,
+        })
+
+    generated_text = "\n\n".join(f"Day {entry['day']} - {entry['focus']}:\n{entry['text']}" for entry in days)
+    return {
+        "days": days,
+        "generated_text": generated_text,
+        "valid": not any(issue.endswith("empty") for issue in issues),
+        "issues": issues,
+    }
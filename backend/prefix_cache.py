@@ -0,0 +1,161 @@
+"""Prompt-prefix KV-cache reuse for the shared Alpaca template.
+
+Every `/generate` prompt starts with the same preamble ("Below is an
+instruction that describes a task..."). `PrefixCache` tokenizes that
+preamble once, runs a single forward pass over it and keeps the resulting
+past key/values. Each request then only prefills its own instruction and
+input: the prefix tokens are prepended to the input ids, and a copy of the
+cached key/values (repeated to the batch size) is handed to
+`model.generate`, which skips the already-cached positions.
+
+For batches, padding goes between the shared prefix and each suffix
+([prefix][pad...][suffix]); the attention mask hides the pads and position
+ids are derived from the mask, so every suffix continues right after the
+prefix.
+
+Run this module directly to compare prefill time and tokens processed with
+and without the cache:
+
+    python prefix_cache.py --model sshleifer/tiny-gpt2 --runs 20
+"""
+import argparse
+import copy
+import time
+
+import torch
+
+
+class PrefixCache:
+    def __init__(self, model, tokenizer, prefix_text):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix_text = prefix_text
+
+        encoded = tokenizer(prefix_text, return_tensors="pt").to(model.device)
+        self.prefix_ids = encoded["input_ids"]
+        # no_grad rather than inference_mode: inference tensors can't be deep-copied
+        with torch.no_grad():
+            self.prefix_past = model(**encoded, use_cache=True).past_key_values
+
+    @property
+    def prefix_length(self):
+        return self.prefix_ids.shape[1]
+
+    def matches(self, prompts):
+        return all(prompt.startswith(self.prefix_text) for prompt in prompts)
+
+    def past_for_batch(self, batch_size):
+        """Fresh copy of the prefix key/values; generate() appends to it in place"""
+        if hasattr(self.prefix_past, "batch_repeat_interleave"):
+            past = copy.deepcopy(self.prefix_past)
+            past.batch_repeat_interleave(batch_size)
+            return past
+        # Legacy tuple-of-(key, value) caches
+        return tuple(
+            (key.repeat(batch_size, 1, 1, 1), value.repeat(batch_size, 1, 1, 1))
+            for key, value in self.prefix_past
+        )
+
+    def build_inputs(self, prompts):
+        """Generate kwargs for prompts that all start with the cached prefix.
+
+        Returns None when a prompt's token ids don't start with the cached
+        prefix ids (the tokenizer merged across the boundary); the caller
+        then prefills the whole prompt instead.
+        """
+        prefix_ids = self.prefix_ids[0].tolist()
+        encoded = []
+        for prompt in prompts:
+            # Tokenize the whole prompt, as the uncached path and fine-tuning did, and slice the
+            # prefix off the ids: a suffix tokenized on its own starts with a different token on
+            # SentencePiece tokenizers ("▁Create" instead of "Create")
+            ids = self.tokenizer(prompt, return_tensors="pt")["input_ids"][0]
+            if ids.shape[0] <= self.prefix_length or ids[:self.prefix_length].tolist() != prefix_ids:
+                return None
+            encoded.append(ids[self.prefix_length:])
+        longest = max(ids.shape[0] for ids in encoded)
+        pad_id = self.tokenizer.pad_token_id
+        device = self.model.device
+
+        input_ids = torch.full((len(prompts), self.prefix_length + longest), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros_like(input_ids)
+        input_ids[:, :self.prefix_length] = self.prefix_ids[0].cpu()
+        attention_mask[:, :self.prefix_length] = 1
+        for row, ids in enumerate(encoded):
+            input_ids[row, -ids.shape[0]:] = ids
+            attention_mask[row, -ids.shape[0]:] = 1
+
+        return {
+            "input_ids": input_ids.to(device),
+            "attention_mask": attention_mask.to(device),
+            "past_key_values": self.past_for_batch(len(prompts)),
+        }
+
+
+def benchmark(model, tokenizer, prefix_text, prompts, runs=10):
+    """Time prefill (one forward pass) for `prompts` with and without the prefix cache"""
+    prefix_cache = PrefixCache(model, tokenizer, prefix_text)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+
+    def full_prefill():
+        inputs = tokenizer(prompts, return_tensors="pt", padding=True).to(model.device)
+        model(**inputs, use_cache=True)
+        return int(inputs["attention_mask"].sum())
+
+    def cached_prefill():
+        inputs = prefix_cache.build_inputs(prompts)
+        if inputs is None:
+            raise ValueError("prompts don't tokenize to the cached prefix ids")
+        suffix_ids = inputs["input_ids"][:, prefix_cache.prefix_length:]
+        model(
+            input_ids=suffix_ids,
+            attention_mask=inputs["attention_mask"],
+            past_key_values=inputs["past_key_values"],
+            use_cache=True,
+        )
+        return int(inputs["attention_mask"][:, prefix_cache.prefix_length:].sum())
+
+    results = {}
+    for name, prefill in (("without_cache", full_prefill), ("with_cache", cached_prefill)):
+        with torch.inference_mode():
+            prefill()  # warm-up
+            start = time.perf_counter()
+            for _ in range(runs):
+                tokens = prefill()
+            elapsed = (time.perf_counter() - start) / runs
+        results[name] = {"prefill_ms": round(elapsed * 1000, 2), "tokens_processed": tokens}
+    results["prefix_tokens"] = prefix_cache.prefix_length
+    results["speedup"] = round(results["without_cache"]["prefill_ms"] / max(results["with_cache"]["prefill_ms"], 1e-6), 2)
+    return results
+
+
+if __name__ == "__main__":
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    parser = argparse.ArgumentParser(description="Prefill benchmark with and without the Alpaca prefix cache")
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    alpaca_prompt = (
+        "Below is an instruction that describes a task, paired with an input that provides further context. "
+        "Write a response that appropriately completes the request.\n\n### Instruction:\n{}\n\n### Input:\n{}\n\n### Response:\n{}"
+    )
+    prefix = alpaca_prompt.split("{}", 1)[0]
+    instruction = (
+        "Create a 7-day workout plan for a 30-year-old male who is a beginner at the gym. "
+        "The person is 190 cm tall, weighs 90 kg, and wants to lose weight to reach 80 kg."
+    )
+
+    bench_tokenizer = AutoTokenizer.from_pretrained(args.model)
+    bench_model = AutoModelForCausalLM.from_pretrained(args.model).eval()
+    print(benchmark(
+        bench_model,
+        bench_tokenizer,
+        prefix,
+        [alpaca_prompt.format(instruction, "", "")] * args.batch_size,
+        runs=args.runs,
+    ))
@@ -0,0 +1,237 @@
+"""Structured (JSON) plan output for `/generate`.
+
+In structured mode decoding is constrained to a compact JSON document with
+the same per-exercise shape as `WORKOUT_PLAN` in the Flask tracker:
+
+    {"1":{"squat":{"sets":4,"target_reps":15,"rest":60},"pushup":{...}},"2":{...},...}
+
+`PlanGrammarState` is a small state machine over that layout. The fixed
+parts (braces, quotes, keys, day numbers) are literals; the model only
+chooses exercise names ([a-z_]+), integers, and whether a day gets another
+exercise. `PlanLogitsProcessor` masks, for every row and step, all tokens
+that would leave the grammar, so the output parses without any
+post-processing. Masks are unions of per-class token id sets that are
+precomputed once per tokenizer (`TokenVocabulary`), so the per-step cost
+is a handful of tensor ops.
+"""
+import json
+import re
+from collections import deque
+
+import torch
+from transformers import LogitsProcessor
+
+NAME_RE = re.compile(r"[a-z_]+")
+MAX_NAME_CHARS = 24
+MAX_INT_DIGITS = 3
+MIN_EXERCISES = 2
+MAX_EXERCISES = 4
+
+EXERCISE_ITEMS = [
+    ("name", None),
+    ("lit", '":{"sets":'),
+    ("int", None),
+    ("lit", ',"target_reps":'),
+    ("int", None),
+    ("lit", ',"rest":'),
+    ("int", None),
+    ("lit", "}"),
+    ("choice", None),
+]
+
+STRUCTURED_INSTRUCTION = (
+    "{query}\n\n"
+    "Answer only with compact JSON: day number -> exercise name (snake_case) -> "
+    '{{"sets": int, "target_reps": int, "rest": seconds}}.'
+)
+
+
+class TokenVocabulary:
+    """Surface text of every token id plus the id sets used to build masks"""
+
+    def __init__(self, tokenizer):
+        self.eos_ids = torch.tensor([tokenizer.eos_token_id])
+        self.texts = self._token_texts(tokenizer)
+        self.size = len(self.texts)
+        self.digit_ids = torch.tensor([i for i, text in enumerate(self.texts) if text.isascii() and text.isdigit()])
+        # JSON integers: no leading zero unless the number is just "0"
+        self.int_start_ids = torch.tensor([
+            i for i, text in enumerate(self.texts) if text.isascii() and text.isdigit() and (text == "0" or text[0] != "0")
+        ])
+        self.name_ids = torch.tensor([i for i, text in enumerate(self.texts) if NAME_RE.fullmatch(text)])
+        self._literal_ids = {}
+
+    @staticmethod
+    def _token_texts(tokenizer):
+        # Decode each token after an anchor so leading-space markers (SentencePiece
+        # "▁", GPT-2 "Ġ") come out as the real text the token adds to the output
+        anchor = tokenizer.encode("a", add_special_tokens=False)[-1]
+        anchor_text = tokenizer.decode([anchor])
+        special = set(tokenizer.all_special_ids)
+        texts = []
+        for token_id in range(len(tokenizer)):
+            if token_id in special:
+                texts.append("")
+                continue
+            text = tokenizer.decode([anchor, token_id])
+            texts.append(text[len(anchor_text):] if text.startswith(anchor_text) else "")
+        return texts
+
+    def literal_ids(self, remaining):
+        """Tokens whose text is a non-empty prefix of the remaining literal"""
+        if remaining not in self._literal_ids:
+            self._literal_ids[remaining] = torch.tensor(
+                [i for i, text in enumerate(self.texts) if text and remaining.startswith(text)], dtype=torch.long
+            )
+        return self._literal_ids[remaining]
+
+
+class PlanGrammarState:
+    """Tracks where one row is in the plan layout and which tokens may come next"""
+
+    def __init__(self, days, min_exercises=MIN_EXERCISES, max_exercises=MAX_EXERCISES):
+        self.days = days
+        self.min_exercises = min_exercises
+        self.max_exercises = max_exercises
+        self.day = 1
+        self.exercises = 1  # exercises started in the current day
+        self.field_length = 0  # characters of the current name/int
+        self.field_zero = False  # current int is "0", which can't take more digits
+        self.failed = False
+        self.items = deque([("lit", '{"1":{"')] + EXERCISE_ITEMS)
+
+    @property
+    def done(self):
+        return self.failed or not self.items
+
+    def choice_options(self):
+        next_exercise = ',"'
+        if self.day < self.days:
+            end_day = '},"%d":{"' % (self.day + 1)
+        else:
+            end_day = "}}"
+        if self.exercises < self.min_exercises:
+            return [next_exercise]
+        if self.exercises >= self.max_exercises:
+            return [end_day]
+        return [next_exercise, end_day]
+
+    def allowed_ids(self, vocab):
+        if self.done:
+            return vocab.eos_ids
+        kind, value = self.items[0]
+        if kind == "lit":
+            return vocab.literal_ids(value)
+        if kind == "choice":
+            return torch.cat([vocab.literal_ids(option) for option in self.choice_options()])
+
+        # name / int: keep going, or start the literal that follows
+        if kind == "name":
+            field_ids = vocab.name_ids
+        else:
+            field_ids = vocab.digit_ids if self.field_length else vocab.int_start_ids
+        limit = MAX_NAME_CHARS if kind == "name" else MAX_INT_DIGITS
+        parts = []
+        if self.field_length < limit and not self.field_zero:
+            parts.append(field_ids)
+        if self.field_length > 0:
+            parts.append(vocab.literal_ids(self.items[1][1]))
+        return torch.cat(parts)
+
+    def advance(self, text):
+        if self.done or not text:
+            return
+        kind, value = self.items[0]
+
+        if kind == "lit":
+            if not value.startswith(text):
+                self.failed = True
+                return
+            remaining = value[len(text):]
+            if remaining:
+                self.items[0] = ("lit", remaining)
+            else:
+                self.items.popleft()
+
+        elif kind in ("name", "int"):
+            matches = NAME_RE.fullmatch(text) if kind == "name" else (text.isascii() and text.isdigit())
+            if matches:
+                self.field_zero = kind == "int" and self.field_length == 0 and text == "0"
+                self.field_length += len(text)
+            else:
+                self.items.popleft()
+                self.field_length = 0
+                self.field_zero = False
+                self.advance(text)
+
+        elif kind == "choice":
+            self.items.popleft()
+            options = self.choice_options()
+            option = next((option for option in options if option.startswith(text)), None)
+            if option is None:
+                self.failed = True
+                return
+            if option == ',"':
+                self.exercises += 1
+                follow = [("lit", option)] + EXERCISE_ITEMS
+            elif self.day < self.days:
+                self.day += 1
+                self.exercises = 1
+                follow = [("lit", option)] + EXERCISE_ITEMS
+            else:
+                follow = [("lit", option)]
+            self.items.extendleft(reversed(follow))
+            self.advance(text)
+
+
+class PlanLogitsProcessor(LogitsProcessor):
+    """Constrains the rows that have a day count to the plan JSON layout.
+
+    `row_days[i]` is the number of days for row i, or None to leave that row
+    unconstrained (so structured and free-text requests can share a batch).
+    """
+
+    def __init__(self, vocab, row_days):
+        self.vocab = vocab
+        self.row_days = row_days
+        self.states = None
+
+    def __call__(self, input_ids, scores):
+        if self.states is None:
+            self.states = [PlanGrammarState(days) if days else None for days in self.row_days]
+        else:
+            for row, state in enumerate(self.states):
+                if state is not None:
+                    state.advance(self.vocab.texts[int(input_ids[row, -1])])
+
+        for row, state in enumerate(self.states):
+            if state is None:
+                continue
+            allowed = state.allowed_ids(self.vocab).to(scores.device)
+            allowed = allowed[allowed < scores.shape[-1]]
+            mask = torch.full_like(scores[row], float("-inf"))
+            mask[allowed] = 0
+            scores[row] = scores[row] + mask
+        return scores
+
+
+def parse_structured_plan(text, days):
+    """Parse and validate generated plan JSON; returns (plan, issues)"""
+    start = text.find("{")
+    try:
+        plan = json.loads(text[start:]) if start >= 0 else None
+    except json.JSONDecodeError as e:
+        return None, [f"invalid JSON: {e.msg}"]
+    if not isinstance(plan, dict):
+        return None, ["no plan object"]
+
+    issues = []
+    for day in range(1, days + 1):
+        exercises = plan.get(str(day))
+        if not exercises:
+            issues.append(f"Day {day}: missing")
+            continue
+        for name, spec in exercises.items():
+            if not all(isinstance(spec.get(key), int) for key in ("sets", "target_reps", "rest")):
+                issues.append(f"Day {day}: {name} incomplete")
+    return plan, issues
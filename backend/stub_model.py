@@ -0,0 +1,154 @@
+"""Deterministic stand-in for the workout LLM, for offline benchmarks.
+
+`StubTokenizer` and `StubModel` implement just enough of the Hugging Face
+tokenizer / `generate` interface for the `/generate` server (batching,
+streaming, stopping criteria, prefix KV reuse) to run unchanged. Output is
+a fixed canned plan, and compute cost is simulated with sleeps:
+
+- prefill: `prefill_latency` seconds per uncached prompt token in the batch
+- decode:  `step_latency` per step plus `row_latency` per sequence per step
+
+so batching, prefix caching and streaming show up in benchmark numbers
+the same way they would on a real model, without a GPU or a download.
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+import torch
+from transformers import BatchEncoding
+
+PAD_ID, EOS_ID, BOS_ID = 0, 1, 2
+SPECIAL_TOKENS = {PAD_ID: "<pad>", EOS_ID: "</s>", BOS_ID: "<s>"}
+
+CANNED_PLAN = (
+    "Day 1: Chest and triceps - bench press 3x10, incline dumbbell press 3x12, dips 3x8, rest 60s. "
+    "Day 2: Back and biceps - deadlift 3x6, lat pulldown 3x12, seated row 3x12, bicep curl 3x12, rest 60s. "
+    "Day 3: Cardio - 30 minutes brisk walk or cycling at moderate pace. "
+    "Day 4: Legs - squat 4x15, lunges 3x12, leg press 3x12, calf raises 3x15, rest 60s. "
+    "Day 5: Shoulders - overhead press 3x10, lateral raises 3x12, face pulls 3x15, rest 45s. "
+    "Day 6: Full body circuit - pushups 3x10, squats 3x15, plank 3x45s, rest 30s. "
+    "Day 7: Rest and mobility - light stretching and foam rolling."
+)
+
+
+class StubTokenizer:
+    """Whitespace tokenizer with a vocabulary that grows as words are seen"""
+
+    pad_token, eos_token, bos_token = "<pad>", "</s>", "<s>"
+    pad_token_id, eos_token_id, bos_token_id = PAD_ID, EOS_ID, BOS_ID
+
+    def __init__(self):
+        self.padding_side = "left"
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._words = dict(SPECIAL_TOKENS)
+
+    def _word_id(self, word):
+        with self._lock:
+            if word not in self._ids:
+                self._ids[word] = len(self._words)
+                self._words[self._ids[word]] = word
+            return self._ids[word]
+
+    def encode(self, text, add_special_tokens=True):
+        ids = [self._word_id(word) for word in text.split()]
+        return [BOS_ID] + ids if add_special_tokens else ids
+
+    def __call__(self, texts, return_tensors=None, padding=False, add_special_tokens=True, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        encoded = [self.encode(text, add_special_tokens) for text in texts]
+        longest = max(len(ids) for ids in encoded)
+        input_ids, attention_mask = [], []
+        for ids in encoded:
+            pad = [PAD_ID] * (longest - len(ids)) if padding else []
+            mask = [0] * len(pad) + [1] * len(ids)
+            if self.padding_side == "left":
+                input_ids.append(pad + ids)
+                attention_mask.append(mask)
+            else:
+                input_ids.append(ids + pad)
+                attention_mask.append(mask[len(pad):] + [0] * len(pad))
+        return BatchEncoding(
+            {"input_ids": input_ids, "attention_mask": attention_mask},
+            tensor_type=return_tensors,
+        )
+
+    def decode(self, ids, skip_special_tokens=False, **kwargs):
+        if hasattr(ids, "tolist"):
+            ids = ids.tolist()
+        words = [
+            self._words.get(token, f"<{token}>") for token in ids
+            if not (skip_special_tokens and token in SPECIAL_TOKENS)
+        ]
+        return " ".join(words)
+
+    def batch_decode(self, sequences, skip_special_tokens=False, **kwargs):
+        return [self.decode(ids, skip_special_tokens=skip_special_tokens) for ids in sequences]
+
+    def save_pretrained(self, path):
+        pass
+
+
+class StubModel:
+    def __init__(self, tokenizer, prefill_latency=0.0002, step_latency=0.02, row_latency=0.002):
+        self.tokenizer = tokenizer
+        self.prefill_latency = prefill_latency
+        self.step_latency = step_latency
+        self.row_latency = row_latency
+        self.device = torch.device("cpu")
+        self.plan_ids = tokenizer.encode(CANNED_PLAN, add_special_tokens=False)
+
+    def eval(self):
+        return self
+
+    def __call__(self, input_ids=None, attention_mask=None, use_cache=True, **kwargs):
+        """Forward pass used by PrefixCache: returns a dummy one-layer KV cache"""
+        batch_size, length = input_ids.shape
+        time.sleep(self.prefill_latency * batch_size * length)
+        kv = torch.zeros(batch_size, 1, length, 1)
+        return SimpleNamespace(past_key_values=((kv, kv.clone()),))
+
+    @staticmethod
+    def _cached_length(past_key_values):
+        if past_key_values is None:
+            return 0
+        if hasattr(past_key_values, "get_seq_length"):
+            return int(past_key_values.get_seq_length())
+        return past_key_values[0][0].shape[2]
+
+    def generate(self, input_ids=None, attention_mask=None, max_new_tokens=20, streamer=None,
+                 stopping_criteria=None, past_key_values=None, **kwargs):
+        batch_size = input_ids.shape[0]
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+
+        # Only positions not covered by the prefix cache cost prefill time
+        uncached = int(attention_mask[:, self._cached_length(past_key_values):].sum())
+        time.sleep(self.prefill_latency * uncached)
+
+        if streamer is not None:
+            streamer.put(input_ids.cpu())
+
+        sequences = input_ids
+        for step in range(max_new_tokens):
+            time.sleep(self.step_latency + self.row_latency * batch_size)
+            token = self.plan_ids[step] if step < len(self.plan_ids) else EOS_ID
+            next_tokens = torch.full((batch_size, 1), token, dtype=torch.long)
+            sequences = torch.cat([sequences, next_tokens], dim=1)
+            if streamer is not None:
+                streamer.put(next_tokens[0])
+            if token == EOS_ID:
+                break
+            if stopping_criteria and any(bool(criteria(sequences, None)) for criteria in stopping_criteria):
+                break
+
+        if streamer is not None:
+            streamer.end()
+        return sequences
+
+
+def load_stub(prefill_latency=0.0002, step_latency=0.02, row_latency=0.002):
+    tokenizer = StubTokenizer()
+    return StubModel(tokenizer, prefill_latency, step_latency, row_latency), tokenizer
@@ -14,8 +14,11 @@ Original file is located at
 # !pip uninstall unsloth -y && pip install --upgrade --no-cache-dir "unsloth[colab-new] @ git+https://github.com/unslothai/unsloth.git"
 
 # !pip install triton
-from unsloth import FastLanguageModel
-import torch
+import os
+from model_backends import load_backend
+
+# "gpu" (Unsloth 4-bit on CUDA) or "cpu" (int8 quantized, multi-threaded)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "gpu")
 max_seq_length = 2048 # Choose any! We auto support RoPE Scaling internally!
 dtype = None # None for auto detection. Float16 for Tesla T4, V100, Bfloat16 for Ampere+
 load_in_4bit = True # Use 4bit quantization to reduce memory usage. Can be False.
@@ -40,117 +43,173 @@ fourbit_models = [
 #     # token = "hf_...", # use one if using gated models like meta-llama/Llama-2-7b-hf
 # )
 
-model, tokenizer = FastLanguageModel.from_pretrained(
-    model_name = "rithesh10/workoutLlama2", # Choose ANY! eg teknium/OpenHermes-2.5-Mistral-7B
-    max_seq_length = max_seq_length,
-    dtype = dtype,
-    load_in_4bit = load_in_4bit,
-    # token = "hf_...", # use one if using gated models like meta-llama/Llama-2-7b-hf
-)
-
-
-# print("Model:", model)  # Should print the model details
-# print("Tokenizer:", tokenizer)  # Should print the tokenizer details
-
-print(model)
-print(tokenizer)
-
-# alpaca_prompt = Copied from above
-alpaca_prompt = """Below is an instruction that describes a task, paired with an input that provides further context. Write a response that appropriately completes the request.
-
-### Instruction:
-{}
-
-### Input:
-{}
-
-### Response:
-{}"""
-
-FastLanguageModel.for_inference(model) # Enable native 2x faster inference
-inputs = tokenizer(
-[
-    alpaca_prompt.format(
-        "Create a 7-day workout plan for a 30-year-old male who is a beginner at the gym. The person is 190 cm tall, weighs 90 kg, and wants to lose weight to reach 80 kg. Please vary the daily exercises, focusing on different muscle groups like chest, back, legs, shoulders, and arms, with cardio incorporated.", # instruction
-        "", # input
-        "", # output - leave this blank for generation!
-    )
-], return_tensors = "pt").to("cuda")
-
-from transformers import TextStreamer
-text_streamer = TextStreamer(tokenizer)
-_ = model.generate(**inputs, streamer = text_streamer, max_new_tokens = 250)
-
-# # Set up your prompt
-# alpaca_prompt = """Below is an instruction that describes a task, paired with an input that provides further context. Write a response that appropriately completes the request.
-
-# ### Instruction:
-# {}
-
-# ### Input:
-# {}
-
-# ### Response:
-# {}"""
-
-# # Define the instruction
-# instruction = "I am a 48-year-old female with a height of 169 cm and a weight of 71 kg. My primary goal is muscle gain, and I aim to reach a target weight of 76 kg. I am a beginner at the gym. Can you create a 7-day workout plan for me?"
-
-# # Tokenize input
-# inputs = tokenizer(
-#     [alpaca_prompt.format(instruction, "", "")],
-#     return_tensors='pt',
-#     max_length=512,  # Specify a maximum length if necessary
-#     padding='max_length',  # Pad to the maximum length
-#     truncation=True  # Truncate to the maximum length
-# )
-
-# # Move inputs to GPU if available
-
-# # Initialize the TextStreamer
-# text_streamer = TextStreamer(tokenizer)
-
-# # Generate response with streaming
-# _ = model.generate(**inputs, streamer=text_streamer, max_new_tokens=250)
+def load_model():
+    """Load the configured inference backend (called at server startup, not import)"""
+    if INFERENCE_BACKEND == "gpu":
+        backend = load_backend(
+            "gpu",
+            model_name = "rithesh10/workoutLlama2", # Choose ANY! eg teknium/OpenHermes-2.5-Mistral-7B
+            max_seq_length = max_seq_length,
+            dtype = dtype,
+            load_in_4bit = load_in_4bit,
+        )
+    else:
+        backend = load_backend(INFERENCE_BACKEND)
+    return backend.load()
 
-if model is None:
-    print("Model loading failed.")
-else:
-    print("Model loaded successfully:", type(model))
+# The notebook's demo request now doubles as the warm-up prompt
+WARMUP_INSTRUCTION = "Create a 7-day workout plan for a 30-year-old male who is a beginner at the gym. The person is 190 cm tall, weighs 90 kg, and wants to lose weight to reach 80 kg. Please vary the daily exercises, focusing on different muscle groups like chest, back, legs, shoulders, and arms, with cardio incorporated."
 
-!pip install fastapi uvicorn pyngrok nest-asyncio
+# Commented out IPython magic to ensure Python compatibility.
+# !pip install fastapi uvicorn pyngrok nest-asyncio
 
-!ngrok authtoken 2bLpXKN8yDr3RbAHoUwGzRODoM1_58WWak7itZ54sXhE5uHWZ
+# !ngrok authtoken 2bLpXKN8yDr3RbAHoUwGzRODoM1_58WWak7itZ54sXhE5uHWZ
 
-import torch
-from fastapi import FastAPI
+import asyncio
+import hmac
+import json
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from pyngrok import ngrok
 import uvicorn
 import nest_asyncio
-from transformers import TextStreamer
 from contextlib import asynccontextmanager
+from typing import Optional
+from adapters import ADAPTERS, DEFAULT_ADAPTER, AdapterRegistry, UnknownAdapterError, parse_adapters
+from generation_scheduler import DeadlineExceeded, GenerationScheduler, QueueFullError
+from plan_cache import PlanCache, profile_cache_key
+from plan_index import PlanIndex
+from prefix_cache import PrefixCache
+from plan_splitter import assemble_plan, build_day_instructions, plan_days
+from structured_output import MAX_EXERCISES, STRUCTURED_INSTRUCTION, parse_structured_plan
+
+# Dynamic batching settings for /generate
+GENERATE_MAX_BATCH_SIZE = int(os.environ.get("GENERATE_MAX_BATCH_SIZE", 8))
+GENERATE_BATCH_WINDOW = float(os.environ.get("GENERATE_BATCH_WINDOW", 0.02))  # seconds
+GENERATE_MAX_NEW_TOKENS = int(os.environ.get("GENERATE_MAX_NEW_TOKENS", 250))
+# Reuse the KV cache of the shared Alpaca preamble across requests
+PROMPT_PREFIX_CACHE = os.environ.get("PROMPT_PREFIX_CACHE", "1") == "1"
+# Short generation pass at startup so kernels/allocators are ready before traffic
+WARMUP_MAX_NEW_TOKENS = int(os.environ.get("WARMUP_MAX_NEW_TOKENS", 8))  # 0 disables warm-up
+# Per-day plan mode: token budget for each day's sub-prompt
+PLAN_DAY_MAX_NEW_TOKENS = int(os.environ.get("PLAN_DAY_MAX_NEW_TOKENS", 200))
+# Structured mode: the JSON grammar ends the decode itself, the budget only has to fit the
+# longest plan it allows: days x MAX_EXERCISES x tokens per exercise (STRUCTURED_MAX_NEW_TOKENS overrides)
+STRUCTURED_MAX_NEW_TOKENS = int(os.environ.get("STRUCTURED_MAX_NEW_TOKENS", 0))
+STRUCTURED_TOKENS_PER_EXERCISE = int(os.environ.get("STRUCTURED_TOKENS_PER_EXERCISE", 32))
+# Admission control: bounded queue and per-request deadline (seconds)
+GENERATE_MAX_QUEUE = int(os.environ.get("GENERATE_MAX_QUEUE", 64))
+GENERATE_TIMEOUT = float(os.environ.get("GENERATE_TIMEOUT", 120))
+WARMUP_BATCH_SIZES = [int(size) for size in os.environ.get("WARMUP_BATCH_SIZES", "1").split(",")]
+# Bearer token for POST/DELETE /adapters ("" disables runtime adapter changes)
+ADAPTER_ADMIN_TOKEN = os.environ.get("ADAPTER_ADMIN_TOKEN", "")
+
+# Workout-plan response cache (keyed on the normalized user profile)
+plan_cache = PlanCache(
+    max_entries=int(os.environ.get("PLAN_CACHE_MAX_ENTRIES", 1024)),
+    max_bytes=int(os.environ.get("PLAN_CACHE_MAX_BYTES", 16 * 1024 * 1024)),
+    ttl=float(os.environ.get("PLAN_CACHE_TTL", 24 * 60 * 60)),
+)
+
+# Vetted-plan nearest-neighbour index, built offline with plan_index.py ("" disables)
+PLAN_INDEX_PATH = os.environ.get("PLAN_INDEX_PATH", "")
+PLAN_INDEX_TOLERANCE = float(os.environ.get("PLAN_INDEX_TOLERANCE", 1.0))
 
 # Define the request model
 class QueryModel(BaseModel):
     query: str
     input_text: str = ""
-
-# Use your pre-initialized model and tokenizer
-# These should be already defined in your previous cell
-external_model = model  # Your pre-initialized model
-external_tokenizer = tokenizer  # Your pre-initialized tokenizer
+    timeout: Optional[float] = None  # seconds, capped at GENERATE_TIMEOUT
+    mode: str = "single"  # "single" (one decode), "plan" (one sub-prompt per day, batched) or "structured" (JSON)
+    adapter: Optional[str] = None  # LoRA adapter, e.g. "workout", "diet", "rehab"; "base" = no adapter
+
+class AdapterModel(BaseModel):
+    name: str  # must be configured in ADAPTERS
+    path: Optional[str] = None  # defaults to (and must match) the ADAPTERS path
+
+# Populated at startup by prepare_service()
+model = None
+tokenizer = None
+scheduler = None
+plan_index = None
+service_state = {
+    "phase": "starting",  # starting, loading, warming, ready, failed
+    "error": None,
+    "load_seconds": None,
+    "warmup_seconds": None,
+}
+
+async def prepare_service():
+    """Load the model, build the scheduler and warm up, then mark the service ready"""
+    global model, tokenizer, scheduler, plan_index
+    loop = asyncio.get_running_loop()
+    try:
+        service_state["phase"] = "loading"
+        start = time.perf_counter()
+        if PLAN_INDEX_PATH:
+            plan_index = await loop.run_in_executor(None, PlanIndex.load, PLAN_INDEX_PATH, PLAN_INDEX_TOLERANCE)
+            print(f"Loaded {len(plan_index)} vetted plans from {PLAN_INDEX_PATH}")
+        model, tokenizer = await loop.run_in_executor(None, load_model)
+        # Every variant shares the base weights; each adapter only adds its LoRA matrices
+        adapters = AdapterRegistry(model, DEFAULT_ADAPTER or None)
+        for name, path in parse_adapters(ADAPTERS).items():
+            await loop.run_in_executor(None, adapters.load, name, path)
+        model = adapters.model
+        # Everything before the instruction is identical for every request
+        prompt_prefix = ALPACA_PROMPT.split("{}", 1)[0]
+        prefix_cache = None
+        if PROMPT_PREFIX_CACHE:
+            def build_prefix_cache():
+                with adapters.activate(adapters.resolve(None)):
+                    return PrefixCache(model, tokenizer, prompt_prefix)
+
+            prefix_cache = await loop.run_in_executor(None, build_prefix_cache)
+        service_state["load_seconds"] = round(time.perf_counter() - start, 2)
+
+        scheduler = GenerationScheduler(
+            model,
+            tokenizer,
+            max_batch_size=GENERATE_MAX_BATCH_SIZE,
+            batch_window=GENERATE_BATCH_WINDOW,
+            max_new_tokens=GENERATE_MAX_NEW_TOKENS,
+            prefix_cache=prefix_cache,
+            max_queue_size=GENERATE_MAX_QUEUE,
+            adapters=adapters,
+        )
+        await scheduler.start()
+
+        if WARMUP_MAX_NEW_TOKENS > 0:
+            service_state["phase"] = "warming"
+            start = time.perf_counter()
+            await scheduler.warm_up(
+                ALPACA_PROMPT.format(WARMUP_INSTRUCTION, "", ""),
+                max_new_tokens=WARMUP_MAX_NEW_TOKENS,
+                batch_sizes=WARMUP_BATCH_SIZES,
+            )
+            service_state["warmup_seconds"] = round(time.perf_counter() - start, 2)
+
+        service_state["phase"] = "ready"
+        print(f"Model ready: load {service_state['load_seconds']}s, warm-up {service_state['warmup_seconds']}s")
+    except Exception as e:
+        service_state["phase"] = "failed"
+        service_state["error"] = str(e)
+        print("Model loading failed:", e)
 
 # Lifespan context manager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Use the external model and tokenizer
-    global model, tokenizer
-    model = external_model
-    tokenizer = external_tokenizer
+    global model, tokenizer, scheduler
+    # Load in the background so /health answers while the model comes up
+    startup = asyncio.create_task(prepare_service())
     yield
     # Clean up resources on shutdown
+    startup.cancel()
+    if scheduler is not None:
+        await scheduler.stop()
+    scheduler = None
     model = None
     tokenizer = None
 
@@ -177,42 +236,314 @@ ALPACA_PROMPT = """Below is an instruction that describes a task, paired with an
 
 ### Response:
 {}"""
+RESPONSE_MARKER = "### Response:"
+
+def not_ready_response():
+    return JSONResponse(
+        status_code=503,
+        content={"status": "error", "message": f"Model is not ready ({service_state['phase']})"},
+        headers={"Retry-After": "5"}
+    )
+
+def queue_full_response(error):
+    return JSONResponse(
+        status_code=429,
+        content={"status": "error", "message": str(error)},
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+def request_timeout(request):
+    if request.timeout and request.timeout > 0:
+        return min(request.timeout, GENERATE_TIMEOUT)
+    return GENERATE_TIMEOUT
+
+def adapter_cache_key(request, key):
+    """Plans from different adapters must not share cache entries"""
+    adapter = scheduler.resolve_adapter(request.adapter)
+    return key if adapter is None else f"{adapter}|{key}"
+
+def retrieve_plan(request):
+    """(plan, distance) from the vetted-plan index, or None to generate.
+
+    The library holds workout plans, so other adapters always generate.
+    """
+    if plan_index is None or scheduler.resolve_adapter(request.adapter) != scheduler.resolve_adapter(None):
+        return None
+    return plan_index.lookup(request.query, request.input_text)
+
+def structured_token_budget(days):
+    return STRUCTURED_MAX_NEW_TOKENS or days * MAX_EXERCISES * STRUCTURED_TOKENS_PER_EXERCISE
+
+def unknown_adapter_response(error):
+    return JSONResponse(status_code=404, content={"status": "error", "message": f"Unknown adapter {error}"})
+
+def response_only(generated_text):
+    """Strip the echoed prompt so cached plans can be reused across profiles"""
+    return generated_text.split(RESPONSE_MARKER, 1)[-1].lstrip("\n")
+
+async def generate_plan(request: QueryModel):
+    """Generate every day of the plan as one batch and assemble the week"""
+    cache_key = adapter_cache_key(request, "plan:" + profile_cache_key(request.query, request.input_text))
+    cached_plan = plan_cache.get(cache_key)
+    if cached_plan is not None:
+        return {"status": "success", **json.loads(cached_plan), "cached": True}
+
+    days = plan_days(request.query, request.input_text)
+    prompts = [
+        ALPACA_PROMPT.format(instruction, request.input_text, "")
+        for instruction in build_day_instructions(request.query, days)
+    ]
+    # One deadline for the whole request, retry included
+    started = time.monotonic()
+    deadline = started + request_timeout(request)
+    outputs = await scheduler.submit_many(
+        prompts, timeout=request_timeout(request), max_new_tokens=PLAN_DAY_MAX_NEW_TOKENS, adapter=request.adapter
+    )
+    day_texts = [response_only(text) for text in outputs]
+
+    # One retry, in a single batch, for days that came back empty, if there is
+    # still as much time left as the first pass took
+    empty = [i for i, text in enumerate(day_texts) if not text.strip()]
+    remaining = deadline - time.monotonic()
+    if empty and remaining >= time.monotonic() - started:
+        retried = await scheduler.submit_many(
+            [prompts[i] for i in empty], timeout=remaining, max_new_tokens=PLAN_DAY_MAX_NEW_TOKENS,
+            adapter=request.adapter
+        )
+        for i, text in zip(empty, retried):
+            day_texts[i] = response_only(text)
+
+    plan = assemble_plan(day_texts)
+    if plan["valid"]:
+        plan_cache.put(cache_key, json.dumps(plan))
+    return {"status": "success", **plan, "cached": False}
+
+async def generate_structured(request: QueryModel):
+    """Decode straight into the WORKOUT_PLAN-shaped JSON layout"""
+    cache_key = adapter_cache_key(request, "structured:" + profile_cache_key(request.query, request.input_text))
+    cached_plan = plan_cache.get(cache_key)
+    if cached_plan is not None:
+        return {"status": "success", "plan": json.loads(cached_plan), "issues": [], "cached": True}
+
+    days = plan_days(request.query, request.input_text)
+    prompt = ALPACA_PROMPT.format(STRUCTURED_INSTRUCTION.format(query=request.query.strip()), request.input_text, "")
+    generated_text = await scheduler.submit(
+        prompt, timeout=request_timeout(request), max_new_tokens=structured_token_budget(days), structured_days=days,
+        adapter=request.adapter
+    )
+    plan, issues = parse_structured_plan(response_only(generated_text), days)
+    if plan is None:
+        return JSONResponse(
+            status_code=502,
+            content={"status": "error", "message": "Model output is not a valid plan", "issues": issues}
+        )
+    if not issues:
+        plan_cache.put(cache_key, json.dumps(plan))
+    return {"status": "success", "plan": plan, "issues": issues, "cached": False}
 
 @app.post("/generate")
 async def generate_text(request: QueryModel):
+    if service_state["phase"] != "ready":
+        return not_ready_response()
     try:
+        if request.mode == "plan":
+            return await generate_plan(request)
+        if request.mode == "structured":
+            return await generate_structured(request)
+
         formatted_prompt = ALPACA_PROMPT.format(
             request.query,
             request.input_text,
             ""
         )
 
-        inputs = tokenizer(
-            [formatted_prompt],
-            return_tensors="pt"
-        ).to("cuda")
-
-        text_streamer = TextStreamer(tokenizer)
-
-        output = model.generate(
-            **inputs,
-            streamer=text_streamer,
-            max_new_tokens=250
+        cache_key = adapter_cache_key(request, profile_cache_key(request.query, request.input_text))
+        cached_plan = plan_cache.get(cache_key)
+        if cached_plan is not None:
+            return {
+                "status": "success",
+                "generated_text": formatted_prompt + cached_plan,
+                "cached": True
+            }
+
+        retrieved = retrieve_plan(request)
+        if retrieved is not None:
+            plan, distance = retrieved
+            return {
+                "status": "success",
+                "generated_text": formatted_prompt + plan,
+                "cached": True,
+                "retrieved": True,
+                "match_distance": round(distance, 3)
+            }
+
+        # Batched with other concurrent requests and run off the event loop
+        generated_text = await scheduler.submit(
+            formatted_prompt, timeout=request_timeout(request), adapter=request.adapter
         )
-
-        generated_text = tokenizer.decode(output[0], skip_special_tokens=True)
+        plan_cache.put(cache_key, response_only(generated_text))
 
         return {
             "status": "success",
-            "generated_text": generated_text
+            "generated_text": generated_text,
+            "cached": False
         }
 
+    except QueueFullError as e:
+        return queue_full_response(e)
+
+    except UnknownAdapterError as e:
+        return unknown_adapter_response(e)
+
+    except DeadlineExceeded as e:
+        return JSONResponse(status_code=504, content={"status": "error", "message": str(e)})
+
     except Exception as e:
         return {
             "status": "error",
             "message": str(e)
         }
 
+@app.post("/generate/stream")
+async def generate_text_stream(request: QueryModel, http_request: Request):
+    """Stream generated tokens to the client as Server-Sent Events"""
+    if service_state["phase"] != "ready":
+        return not_ready_response()
+    formatted_prompt = ALPACA_PROMPT.format(
+        request.query,
+        request.input_text,
+        ""
+    )
+
+    try:
+        cache_key = adapter_cache_key(request, profile_cache_key(request.query, request.input_text))
+    except UnknownAdapterError as e:
+        return unknown_adapter_response(e)
+    cached_plan = plan_cache.get(cache_key)
+    if cached_plan is None:
+        retrieved = retrieve_plan(request)
+        cached_plan = retrieved[0] if retrieved is not None else None
+    if cached_plan is not None:
+        async def cached_stream():
+            yield f"data: {json.dumps({'token': cached_plan})}\n\n"
+            yield "event: done\ndata: {\"cached\": true}\n\n"
+
+        return StreamingResponse(cached_stream(), media_type="text/event-stream")
+
+    try:
+        tokens = scheduler.stream(formatted_prompt, timeout=request_timeout(request), adapter=request.adapter)
+    except QueueFullError as e:
+        return queue_full_response(e)
+
+    async def event_stream():
+        chunks = []
+        try:
+            async for text in tokens:
+                if await http_request.is_disconnected():
+                    break
+                chunks.append(text)
+                yield f"data: {json.dumps({'token': text})}\n\n"
+            else:
+                # Only complete generations are worth caching
+                plan_cache.put(cache_key, "".join(chunks))
+                yield "event: done\ndata: {\"cached\": false}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'message': str(e)})}\n\n"
+        finally:
+            # Stops model.generate if the client went away mid-stream
+            await tokens.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/health")
+async def health():
+    """Liveness: the process is up, even while the model is still loading"""
+    return {"status": "ok", "phase": service_state["phase"]}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: only 200 once the model is loaded and warmed up"""
+    status_code = 200 if service_state["phase"] == "ready" else 503
+    return JSONResponse(status_code=status_code, content=service_state)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return plan_cache.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Queue depth, queue wait times and scheduler counters"""
+    return {
+        "phase": service_state["phase"],
+        "scheduler": scheduler.metrics() if scheduler is not None else None,
+        "cache": plan_cache.stats(),
+        "plan_index": plan_index.stats() if plan_index is not None else None
+    }
+
+@app.get("/adapters")
+async def list_adapters():
+    """Loaded adapters with their parameter memory next to the shared base"""
+    if scheduler is None:
+        return not_ready_response()
+    return scheduler.adapters.stats()
+
+def adapter_admin_error(http_request):
+    """Error response unless the request carries ADAPTER_ADMIN_TOKEN, None when it does"""
+    if not ADAPTER_ADMIN_TOKEN:
+        return JSONResponse(status_code=403, content={"status": "error", "message": "Adapter management is disabled"})
+    supplied = http_request.headers.get("Authorization", "")
+    if not hmac.compare_digest(supplied.encode(), f"Bearer {ADAPTER_ADMIN_TOKEN}".encode()):
+        return JSONResponse(status_code=401, content={"status": "error", "message": "Invalid admin token"})
+    return None
+
+@app.post("/adapters")
+async def load_adapter(request: AdapterModel, http_request: Request):
+    """Hot-load (or replace) a LoRA adapter without reloading the base model.
+
+    Only adapters listed in ADAPTERS can be loaded, and only from their
+    configured path: loading adapter files (e.g. pickled .bin weights) can
+    run code, so callers never choose where they come from.
+    """
+    global model
+    if service_state["phase"] != "ready":
+        return not_ready_response()
+    error = adapter_admin_error(http_request)
+    if error is not None:
+        return error
+    path = parse_adapters(ADAPTERS).get(request.name)
+    if path is None or request.path not in (None, path):
+        return JSONResponse(status_code=403, content={
+            "status": "error", "message": f"Adapter {request.name} is not configured in ADAPTERS with that path"
+        })
+    try:
+        await scheduler.load_adapter(request.name, path)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"status": "error", "message": str(e)})
+    model = scheduler.model
+    # A replaced adapter may answer differently; drop plans cached from the old weights
+    plan_cache.clear()
+    return {"status": "success", **scheduler.adapters.stats()}
+
+@app.delete("/adapters/{name}")
+async def unload_adapter(name: str, http_request: Request):
+    if service_state["phase"] != "ready":
+        return not_ready_response()
+    error = adapter_admin_error(http_request)
+    if error is not None:
+        return error
+    try:
+        await scheduler.unload_adapter(name)
+    except UnknownAdapterError as e:
+        return unknown_adapter_response(e)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"status": "error", "message": str(e)})
+    plan_cache.clear()
+    return {"status": "success", **scheduler.adapters.stats()}
+
 # Run the server
 if __name__ == "__main__":
     # Apply nest_asyncio for Colab compatibility
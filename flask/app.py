@@ -10,17 +10,57 @@ import threading
 import random
 import requests
 import json
+import io
+import uuid
+import functools
+from array import array
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
+# Load environment variables from .env file (before the local modules below
+# read their settings from the environment at import time)
 load_dotenv()
 
+from session_store import (
+    SESSION_PUBLISH_INTERVAL, SESSION_STORE, ForwardError, WorkerAgent,
+    decode_body, encode_body, get_json, open_store, put_json
+)
+from video_ladder import FrameLadder, ViewerPacer, limit_send_buffer
+from user_rollups import PERIODS, USER_ROLLUP_DB, RollupStore, UserResolver
+from pose_backends import POSE_BACKEND, POSE_BENCHMARK_FRAMES, benchmark_backends, choose_backend, create_estimator
+
+try:
+    import pyarrow as pa  # optional: Arrow IPC export
+except ImportError:
+    pa = None
+
 app = Flask(__name__)
 CORS(app)
 
 # Configuration for Node.js backend (use environment variable for production)
 NODEJS_BACKEND_URL = os.environ.get('NODEJS_BACKEND_URL', 'http://localhost:4000/api/v1/user')
 
+# Capture source and supervisor settings
+CAMERA_INDEX = os.environ.get('CAMERA_INDEX', '0')
+CAPTURE_MAX_READ_FAILURES = int(os.environ.get('CAPTURE_MAX_READ_FAILURES', 30))  # consecutive failed reads before reopening
+CAPTURE_FAILURE_SLEEP = float(os.environ.get('CAPTURE_FAILURE_SLEEP', 0.02))  # pause between failed reads
+CAPTURE_BACKOFF_INITIAL = float(os.environ.get('CAPTURE_BACKOFF_INITIAL', 0.5))
+CAPTURE_BACKOFF_MAX = float(os.environ.get('CAPTURE_BACKOFF_MAX', 8.0))
+CAPTURE_STALL_TIMEOUT = float(os.environ.get('CAPTURE_STALL_TIMEOUT', 30.0))  # stop session after this long without frames
+
+# Circuit mode: movement detection switches exercises without restarting the pipeline
+CIRCUIT_DETECT_WINDOW = int(os.environ.get('CIRCUIT_DETECT_WINDOW', 45))  # frames of joint angles per classification
+CIRCUIT_DETECT_HOLD = int(os.environ.get('CIRCUIT_DETECT_HOLD', 15))  # consecutive agreeing frames before switching
+CIRCUIT_MIN_RANGE = float(os.environ.get('CIRCUIT_MIN_RANGE', 45))  # degrees of joint travel that count as movement
+
+# Columnar session export
+SESSION_TRACE_MAX_FRAMES = int(os.environ.get('SESSION_TRACE_MAX_FRAMES', 36000))  # per-frame trace cap, 0 disables
+SESSION_UPLOAD_URL = os.environ.get('SESSION_UPLOAD_URL', '')  # bulk upload target for /session/upload
+
+# Joint kinematics (per-rep tempo and momentum)
+KINEMATICS_SPAN = int(os.environ.get('KINEMATICS_SPAN', 4))  # frames each velocity/acceleration is differenced across
+KINEMATICS_MIN_ANGULAR_SPEED = float(os.environ.get('KINEMATICS_MIN_ANGULAR_SPEED', 15))  # deg/s, slower counts as a pause
+KINEMATICS_MIN_SPEED = float(os.environ.get('KINEMATICS_MIN_SPEED', 0.1))  # normalized units/s; a slower moving joint doesn't count toward momentum
+
 # -----------------------------
 # Mediapipe setup
 # -----------------------------
@@ -51,6 +91,18 @@ EXERCISE_CONFIG = {
     }
 }
 
+# Kinematics per exercise: which way the joint angle moves during the lifting
+# (concentric) phase, the joint that should carry the movement, and joints
+# that should stay still (their speed relative to the moving joint is momentum)
+EXERCISE_KINEMATICS = {
+    'bicep_curl': {'concentric': 'closing', 'moving': 'RIGHT_WRIST', 'anchors': ['RIGHT_SHOULDER', 'RIGHT_ELBOW']},
+    'squat': {'concentric': 'opening', 'moving': 'RIGHT_HIP', 'anchors': ['RIGHT_ANKLE']},
+    'pushup': {'concentric': 'opening', 'moving': 'RIGHT_SHOULDER', 'anchors': ['RIGHT_WRIST']}
+}
+TEMPO_CONCENTRIC = (0.8, 2.5)  # seconds, ideal range for the lifting phase
+TEMPO_ECCENTRIC = (1.0, 3.5)  # seconds, ideal range for the lowering phase
+MOMENTUM_LIMIT = 0.3  # anchor/moving joint speed ratio above which the rep is swung
+
 WORKOUT_PLAN = {
     "bicep_curl": {"target_reps": 12, "sets": 3, "rest": 45},
     "squat": {"target_reps": 15, "sets": 4, "rest": 60},
@@ -129,6 +181,118 @@ FORM_CORRECTIONS = {
     }
 }
 
+# -----------------------------
+# Columnar export layout
+# -----------------------------
+EXPORT_VERSION = 2
+EXERCISE_CODES = list(EXERCISE_CONFIG)
+QUALITY_CODES = ['excellent', 'good', 'poor', 'incomplete']
+STAGE_CODES = ['down', 'up']
+SCORE_KEYS = ['knee_alignment', 'back_position', 'hip_alignment', 'range_of_motion', 'tempo', 'overall']
+KINEMATICS_KEYS = ['concentric_time', 'eccentric_time', 'momentum_ratio', 'peak_acceleration']
+# Form issues are stored as a bitmask over this list
+ISSUE_CODES = sorted({issue for corrections in FORM_CORRECTIONS.values() for issue in corrections})
+
+def new_rep_columns():
+    """One typed array per per-rep field (array.array appends are cheap in the capture loop)"""
+    columns = {
+        'rep_number': array('H'),
+        'exercise': array('B'),
+        'quality': array('B'),
+        'score': array('f'),
+        'duration': array('f'),
+        'timestamp': array('d'),
+        'issues': array('I')
+    }
+    columns.update({key: array('f') for key in SCORE_KEYS + KINEMATICS_KEYS})
+    return columns
+
+def new_frame_columns():
+    return {
+        'time': array('f'),  # seconds since the session started
+        'exercise': array('B'),
+        'angle': array('f'),
+        'overall': array('B'),
+        'stage': array('B'),
+        'reps': array('H')
+    }
+
+# -----------------------------
+# Joint kinematics ring buffer
+# -----------------------------
+class LandmarkRing:
+    """Landmark positions, velocities and accelerations of the last KINEMATICS_SPAN + 1 frames.
+
+    All arrays are allocated once. Each push writes one slot in place and
+    differences it against the oldest slot, KINEMATICS_SPAN frames back,
+    so the per-frame cost is constant and the span smooths out landmark
+    jitter that frame-to-frame differences would amplify.
+    """
+
+    def __init__(self, span=KINEMATICS_SPAN, joints=33):
+        self.span = span
+        self.size = span + 1
+        self.times = np.zeros(self.size)
+        self.positions = np.zeros((self.size, joints, 2), dtype=np.float32)
+        self.velocities = np.zeros((self.size, joints, 2), dtype=np.float32)  # units/s
+        self.accelerations = np.zeros((self.size, joints, 2), dtype=np.float32)
+        self.angles = np.zeros(self.size, dtype=np.float32)
+        self.angular_velocities = np.zeros(self.size, dtype=np.float32)  # deg/s
+        # Per-slot x/y column views, so a push copies landmarks straight into the buffer
+        self._columns = [(self.positions[slot, :, 0], self.positions[slot, :, 1]) for slot in range(self.size)]
+        self.clear()
+
+    def clear(self):
+        self.index = -1
+        self.count = 0
+
+    def push(self, landmarks, angle, now):
+        prev = self.index
+        i = (prev + 1) % self.size
+        xs, ys = self._columns[i]
+        for joint, landmark in enumerate(landmarks):
+            xs[joint] = landmark.x
+            ys[joint] = landmark.y
+        self.angles[i] = angle
+        self.times[i] = now
+        dt = now - self.times[prev] if self.count else 0.0
+        back = (i - min(self.count, self.span)) % self.size  # oldest frame kept
+        span_dt = now - self.times[back]
+
+        if self.count and span_dt > 0:
+            # velocity = (p[i] - p[back]) / span_dt, acceleration = (v[i] - v[back]) / span_dt
+            np.subtract(self.positions[i], self.positions[back], out=self.velocities[i])
+            self.velocities[i] /= span_dt
+            np.subtract(self.velocities[i], self.velocities[back], out=self.accelerations[i])
+            self.accelerations[i] /= span_dt
+            self.angular_velocities[i] = (angle - self.angles[back]) / span_dt
+        else:
+            self.velocities[i] = 0
+            self.accelerations[i] = 0
+            self.angular_velocities[i] = 0
+
+        self.index = i
+        self.count = min(self.count + 1, self.size)
+        return dt
+
+    def speed(self, joint):
+        velocity = self.velocities[self.index, joint]
+        return float(np.hypot(velocity[0], velocity[1]))
+
+    def acceleration(self, joint):
+        acceleration = self.accelerations[self.index, joint]
+        return float(np.hypot(acceleration[0], acceleration[1]))
+
+def new_rep_kinematics():
+    """Running per-rep accumulators, updated in O(1) per frame"""
+    return {
+        'concentric_time': 0.0,
+        'eccentric_time': 0.0,
+        'peak_moving_speed': 0.0,
+        'peak_anchor_speed': 0.0,
+        'peak_acceleration': 0.0
+    }
+
 # -----------------------------
 # Global State with enhanced tracking
 # -----------------------------
@@ -150,9 +314,17 @@ state = {
     'target_reps': 0,
     'in_rest': False,
     'rest_end_time': 0.0,
-    'latest_frame': None,
+    'video_ladder': FrameLadder(),  # latest annotated frame and its JPEG renditions
     'capture_thread': None,
     'fps': 0,
+    # Shared session store (see session_store.py)
+    'session_id': None,
+    'frame_seq': 0,
+    'last_publish_time': 0.0,
+    # Pose estimator backend (see pose_backends.py)
+    'pose_backend': None,
+    'pose_auto_backend': None,  # POSE_BACKEND=auto result, benchmarked once per process
+    'pose_benchmark': None,
     # Enhanced tracking
     'rep_quality_score': 0,
     'total_good_reps': 0,
@@ -175,7 +347,31 @@ state = {
     'injury_risks': [],
     'rep_history': [],  # Store each rep's detailed data
     'active_injury_alert': None,
-    'form_trend': 'stable'  # improving, stable, declining
+    'form_trend': 'stable',  # improving, stable, declining
+    'injury_counts': {},  # severity -> injury risks seen at completed reps
+    'user_id': None,  # backend user of the session, when /start was authorized
+    # Capture source health (see capture supervisor)
+    'source_health': 'idle',  # idle, ok, degraded, reconnecting, failed
+    'reconnect_count': 0,
+    'read_failures': 0,
+    'consecutive_read_failures': 0,
+    'last_frame_time': 0.0,
+    'stop_reason': None,
+    # Circuit mode (see circuit sessions)
+    'exercise_start_time': 0.0,
+    'exercise_complete': False,
+    'circuit': None,
+    'pending_exercise': None,
+    'movement_window': deque(maxlen=CIRCUIT_DETECT_WINDOW),
+    'detected_exercise': None,
+    'detect_streak': 0,
+    # Columnar per-rep data and per-frame traces for /session/export
+    'rep_columns': new_rep_columns(),
+    'frame_columns': new_frame_columns(),
+    # Joint kinematics for tempo and momentum scoring
+    'landmark_ring': LandmarkRing(),
+    'rep_kinematics': new_rep_kinematics(),
+    'last_rep_kinematics': None
 }
 
 # -----------------------------
@@ -337,18 +533,21 @@ def calculate_detailed_form_scores(landmarks, exercise):
         elif elbow_forward > 0.15:
             scores['hip_alignment'] = max(75, 100 - (elbow_forward - 0.15) * 200)
         
-        # Check for momentum/swinging
-        elbow_movement = abs(elbow.x - shoulder.x)
-        if elbow_movement > 0.25:
-            scores['knee_alignment'] = max(40, 100 - (elbow_movement - 0.25) * 400)
+        # Check for momentum/swinging: shoulder and elbow moving with the wrist
+        momentum = live_momentum_ratio()
+        if momentum > MOMENTUM_LIMIT:
+            scores['knee_alignment'] = max(40, 100 - (momentum - MOMENTUM_LIMIT) * 150)
             injury_risks.append({
                 'severity': 'low',
                 'issue': 'Using momentum instead of muscle',
                 'recommendation': 'Control the weight - no swinging!'
             })
     
-    # Tempo score (check rep timing)
-    if state['average_rep_time'] > 0:
+    # Tempo score: measured concentric/eccentric phases of the last rep
+    last_kinematics = state['last_rep_kinematics']
+    if last_kinematics is not None:
+        scores['tempo'] = last_kinematics['tempo_score']
+    elif state['average_rep_time'] > 0:
         # Ideal rep time: 2-4 seconds
         if state['average_rep_time'] < 1.5:
             scores['tempo'] = 60  # Too fast
@@ -403,6 +602,9 @@ def check_detailed_form(landmarks, exercise):
         elif exercise == "bicep_curl":
             form_issues.append('partial_range')
     
+    if scores['tempo'] < 70 and exercise == "bicep_curl":
+        form_issues.append('too_fast')
+    
     # Store scores and injury risks in state
     state['detailed_scores'] = scores
     state['injury_risks'] = injury_risks
@@ -434,6 +636,7 @@ def process_pose(landmarks, exercise):
     raw_angle = calculate_angle(joints[0], joints[1], joints[2])
     smoothed = smooth_angle(raw_angle)
     state['angle'] = int(smoothed)
+    update_kinematics(landmarks, exercise, smoothed, now)
 
     # Check form issues
     form_issues = check_detailed_form(landmarks, exercise)
@@ -471,6 +674,7 @@ def process_pose(landmarks, exercise):
                 state['last_rep_time'] = now
                 state['calories_burned'] += cfg['calories_per_rep']
                 state['rep_quality_score'] = overall_form_score
+                kinematics = finish_rep_kinematics()
                 
                 # Store detailed rep data
                 rep_data = {
@@ -480,9 +684,13 @@ def process_pose(landmarks, exercise):
                     'duration': round(rep_duration, 2),
                     'timestamp': now,
                     'detailed_scores': detailed_scores.copy(),
-                    'issues': state['form_issues'].copy()
+                    'issues': state['form_issues'].copy(),
+                    'kinematics': kinematics
                 }
                 state['rep_history'].append(rep_data)
+                record_rep_columns(rep_data, exercise)
+                for risk in state['injury_risks']:
+                    state['injury_counts'][risk['severity']] = state['injury_counts'].get(risk['severity'], 0) + 1
                 
                 # Track rep timing
                 state['rep_times'].append(rep_duration)
@@ -531,6 +739,7 @@ def process_pose(landmarks, exercise):
                         state['consecutive_good_reps'] = 0
                         state['last_motivation_rep'] = 0
                     else:
+                        state['exercise_complete'] = True
                         state['feedback'] = "🎉🏆 WORKOUT COMPLETE! You're amazing! 🏆🎉"
             
             else:
@@ -571,84 +780,182 @@ def process_pose(landmarks, exercise):
         state['total_workout_time'] = int(time.time() - state['workout_start_time'])
 
 # -----------------------------
-# Video capture thread (unchanged)
+# Joint kinematics: tempo and momentum per rep
 # -----------------------------
-def capture_frames():
-    cap = cv2.VideoCapture(0)
-    last_time = time.time()
-
-    with mp_pose.Pose(min_detection_confidence=0.7, min_tracking_confidence=0.7) as pose:
-        while state['is_running']:
-            ok, frame = cap.read()
-            if not ok:
-                continue
-            frame = cv2.flip(frame, 1)
-            image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = pose.process(image)
-
-            if results.pose_landmarks:
-                process_pose(results.pose_landmarks.landmark, state['exercise'])
-                mp_drawing.draw_landmarks(frame, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
-
-            # Display enhanced information
-            # cv2.putText(frame, f"Reps: {state['reps']} (Set {state['current_set']}/{state['total_sets']})",
-                        # (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
-            
-            # Quality indicator
-            quality_color = (0, 255, 0) if state['rep_quality_score'] > 75 else (0, 165, 255) if state['rep_quality_score'] > 50 else (0, 0, 255)
-            # cv2.putText(frame, f"Quality: {state['rep_quality_score']}/100", 
-            #             (20, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.7, quality_color, 2)
-            
-            # Feedback with word wrapping for long messages
-            feedback_lines = [state['feedback'][i:i+50] for i in range(0, len(state['feedback']), 50)]
-            # for i, line in enumerate(feedback_lines[:2]):  # Max 2 lines
-            #     cv2.putText(frame, line, (20, 80 + i*25),
-            #                 cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0,255,0), 2)
+def update_kinematics(landmarks, exercise, angle, now):
+    """Push the frame into the ring buffer and advance the current rep's accumulators"""
+    ring = state['landmark_ring']
+    dt = ring.push(landmarks, angle, now)
+    if dt <= 0:
+        return
 
-            _, buffer = cv2.imencode('.jpg', frame)
-            state['latest_frame'] = buffer.tobytes()
+    cfg = EXERCISE_KINEMATICS[exercise]
+    angular_velocity = float(ring.angular_velocities[ring.index])
+    rep = state['rep_kinematics']
+    if abs(angular_velocity) >= KINEMATICS_MIN_ANGULAR_SPEED:
+        closing = angular_velocity < 0
+        if closing == (cfg['concentric'] == 'closing'):
+            rep['concentric_time'] += dt
+        else:
+            rep['eccentric_time'] += dt
 
-            current_time = time.time()
-            state['fps'] = round(1 / (current_time - last_time), 1)
-            last_time = current_time
+    moving = getattr(mp_pose.PoseLandmark, cfg['moving']).value
+    moving_speed = ring.speed(moving)
+    rep['peak_acceleration'] = max(rep['peak_acceleration'], ring.acceleration(moving))
+    # Anchor jitter while the moving joint is (nearly) still says nothing about swinging
+    if moving_speed < KINEMATICS_MIN_SPEED:
+        return
+    anchor_speed = max(ring.speed(getattr(mp_pose.PoseLandmark, name).value) for name in cfg['anchors'])
+    rep['peak_moving_speed'] = max(rep['peak_moving_speed'], moving_speed)
+    rep['peak_anchor_speed'] = max(rep['peak_anchor_speed'], anchor_speed)
 
-    cap.release()
-    cv2.destroyAllWindows()
+def live_momentum_ratio():
+    """Peak anchor-joint speed relative to the moving joint so far this rep"""
+    rep = state['rep_kinematics']
+    if rep['peak_moving_speed'] < KINEMATICS_MIN_SPEED:
+        return 0.0
+    return rep['peak_anchor_speed'] / rep['peak_moving_speed']
+
+def phase_score(seconds, ideal):
+    """100 inside the ideal range, down to 60 at half the minimum, 75 when very slow"""
+    low, high = ideal
+    if seconds < low:
+        return int(60 + 40 * max(0.0, seconds - low / 2) / (low / 2))
+    if seconds > high * 2:
+        return 75
+    return 100 if seconds <= high else int(100 - 25 * (seconds - high) / high)
+
+def finish_rep_kinematics():
+    """Score the rep that just completed and start accumulating the next one"""
+    rep = state['rep_kinematics']
+    momentum = live_momentum_ratio()
+    kinematics = {
+        'concentric_time': round(rep['concentric_time'], 2),
+        'eccentric_time': round(rep['eccentric_time'], 2),
+        'momentum_ratio': round(momentum, 3),
+        'peak_speed': round(rep['peak_moving_speed'], 3),
+        'peak_acceleration': round(rep['peak_acceleration'], 2),
+        'tempo_score': int((phase_score(rep['concentric_time'], TEMPO_CONCENTRIC) +
+                            phase_score(rep['eccentric_time'], TEMPO_ECCENTRIC)) / 2),
+        'momentum_score': int(max(40, 100 - max(0.0, momentum - MOMENTUM_LIMIT) * 150))
+    }
+    state['last_rep_kinematics'] = kinematics
+    state['rep_kinematics'] = new_rep_kinematics()
+    return kinematics
+
+def kinematics_status():
+    ring = state['landmark_ring']
+    rep = state['rep_kinematics']
+    return {
+        "angular_velocity": round(float(ring.angular_velocities[ring.index]), 1) if ring.count else 0,
+        "concentric_time": round(rep['concentric_time'], 2),
+        "eccentric_time": round(rep['eccentric_time'], 2),
+        "momentum_ratio": round(live_momentum_ratio(), 3),
+        "last_rep": state['last_rep_kinematics']
+    }
 
 # -----------------------------
-# Enhanced API Endpoints
+# Columnar recording
 # -----------------------------
-@app.route("/start/<exercise>", methods=["POST"])
-def start(exercise):
-    if exercise not in EXERCISE_CONFIG:
-        return jsonify({"error": "Invalid exercise"}), 400
+def record_rep_columns(rep_data, exercise):
+    columns = state['rep_columns']
+    columns['rep_number'].append(rep_data['rep_number'])
+    columns['exercise'].append(EXERCISE_CODES.index(exercise))
+    columns['quality'].append(QUALITY_CODES.index(rep_data['quality']))
+    columns['score'].append(rep_data['score'])
+    columns['duration'].append(rep_data['duration'])
+    columns['timestamp'].append(rep_data['timestamp'])
+    columns['issues'].append(sum(1 << ISSUE_CODES.index(issue) for issue in rep_data['issues'] if issue in ISSUE_CODES))
+    for key in SCORE_KEYS:
+        columns[key].append(rep_data['detailed_scores'].get(key, 100))
+    for key in KINEMATICS_KEYS:
+        columns[key].append(rep_data['kinematics'][key])
 
-    t_old = state.get('capture_thread')
-    if t_old and t_old.is_alive():
-        state['is_running'] = False
-        t_old.join()
+def record_frame_columns(now):
+    columns = state['frame_columns']
+    if len(columns['time']) >= SESSION_TRACE_MAX_FRAMES:
+        return
+    columns['time'].append(now - state['workout_start_time'])
+    columns['exercise'].append(EXERCISE_CODES.index(state['exercise']))
+    columns['angle'].append(state['angle'])
+    columns['overall'].append(int(state['detailed_scores'].get('overall', 100)))
+    columns['stage'].append(STAGE_CODES.index(state['stage']))
+    columns['reps'].append(state['reps'])
+
+def column_array(column):
+    # Copy via tobytes(): a live buffer view would stop the capture thread from appending
+    return np.frombuffer(column.tobytes(), dtype=np.dtype(column.typecode))
+
+def column_arrays(columns):
+    """Copies of a table's columns, cut to the rows every column already has.
+
+    The capture thread keeps appending while the columns are copied one by
+    one; rows only ever grow at the end, so the shortest copy marks the last
+    complete row.
+    """
+    arrays = {name: column_array(column) for name, column in columns.items()}
+    rows = min(len(array) for array in arrays.values())
+    return {name: array[:rows] for name, array in arrays.items()}
 
+def export_metadata():
+    return {
+        "version": EXPORT_VERSION,
+        "session_start": state['workout_start_time'],
+        "exercise_codes": EXERCISE_CODES,
+        "quality_codes": QUALITY_CODES,
+        "stage_codes": STAGE_CODES,
+        "issue_bits": ISSUE_CODES,
+        "is_running": state['is_running']
+    }
+
+def export_npz(include_frames):
+    """Session columns as a compressed .npz (one fixed-width array per column)"""
+    arrays = {'rep.' + name: array for name, array in column_arrays(state['rep_columns']).items()}
+    if include_frames:
+        arrays.update({'frame.' + name: array for name, array in column_arrays(state['frame_columns']).items()})
+    # Stored as a unicode scalar so loading never needs allow_pickle
+    arrays['meta'] = np.array(json.dumps(export_metadata()))
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+def export_arrow(table_name):
+    """One table (reps or frames) as an Arrow IPC stream"""
+    columns = state['rep_columns'] if table_name == 'reps' else state['frame_columns']
+    table = pa.table(column_arrays(columns))
+    table = table.replace_schema_metadata({'meta': json.dumps(export_metadata())})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def compact_summary(summary):
+    """The /stop response: aggregates only, per-rep data lives in /session/export"""
+    summary = {key: value for key, value in summary.items() if key != 'rep_data'}
+    if 'exercises' in summary:
+        summary['exercises'] = [compact_summary(segment) for segment in summary['exercises']]
+    return summary
+
+# -----------------------------
+# Session and summary helpers
+# -----------------------------
+def reset_exercise_state(exercise, now):
+    """Per-exercise counters; the capture pipeline and session clock are untouched"""
     plan = WORKOUT_PLAN[exercise]
-    now = time.time()
     state.update({
-        'is_running': True,
         'exercise': exercise,
         'reps': 0,
         'stage': 'down',
-        'feedback': f"{get_random_message('start')} Starting {exercise.title()}!",
         'angle': 0,
         'form_score': 100,
         'last_rep_time': now,
-        'workout_start_time': now,
-        'total_workout_time': 0,
+        'exercise_start_time': now,
         'calories_burned': 0.0,
         'current_set': 1,
         'total_sets': plan['sets'],
         'target_reps': plan['target_reps'],
         'in_rest': False,
         'rest_end_time': 0.0,
-        'latest_frame': None,
-        'fps': 0,
         'rep_quality_score': 0,
         'total_good_reps': 0,
         'consecutive_good_reps': 0,
@@ -656,49 +963,37 @@ def start(exercise):
         'form_issues': [],
         'last_feedback_time': 0,
         'average_rep_time': 0,
-        'best_rep_quality': 0
+        'best_rep_quality': 0,
+        'injury_risks': [],
+        'rep_history': [],
+        'exercise_complete': False,
+        'rep_kinematics': new_rep_kinematics(),
+        'last_rep_kinematics': None,
+        'injury_counts': {}
     })
     state['angle_history'].clear()
     state['rep_times'].clear()
+    state['landmark_ring'].clear()
+    if state['user_id']:
+        state['form_trend'] = rollup_store.form_trend(state['user_id'], exercise)
 
-    t = threading.Thread(target=capture_frames, daemon=True)
-    t.start()
-    state['capture_thread'] = t
-
-    return jsonify({
-        "status": "started", 
-        "plan": plan,
-        "message": f"Let's crush this {exercise} workout! 💪"
-    })
-
-@app.route("/stop", methods=["POST"])
-def stop():
-    state['is_running'] = False
-    t = state.get('capture_thread')
-    if t and t.is_alive():
-        t.join()
-    state['capture_thread'] = None
-    
-    # Calculate workout duration
-    workout_duration = int(time.time() - state['workout_start_time']) if state['workout_start_time'] > 0 else 0
-    
-    # Calculate average form scores from rep history
-    rep_history = state.get('rep_history', [])
+def average_form_scores(rep_history, overall):
+    """Average each form score over the reps, or 100s when there are none"""
     avg_scores = {
         'knee_alignment': 100,
         'back_position': 100,
         'hip_alignment': 100,
         'range_of_motion': 100,
         'tempo': 100,
-        'overall': state.get('detailed_scores', {}).get('overall', 100)
+        'overall': overall
     }
-    
+
     if rep_history:
         for score_key in avg_scores.keys():
             if score_key != 'overall':
                 scores = [rep.get('detailed_scores', {}).get(score_key, 100) for rep in rep_history]
                 avg_scores[score_key] = int(sum(scores) / len(scores)) if scores else 100
-        
+
         # Recalculate overall from averages
         avg_scores['overall'] = int(
             avg_scores['knee_alignment'] * 0.25 +
@@ -707,37 +1002,718 @@ def stop():
             avg_scores['range_of_motion'] * 0.15 +
             avg_scores['tempo'] * 0.10
         )
-    
-    # Provide detailed workout summary
-    summary = {
+    return avg_scores
+
+def summarize_exercise(start_time, end_time):
+    """Workout summary for the active exercise, in the shape /stop returns"""
+    rep_history = state.get('rep_history', [])
+    duration = int(end_time - start_time) if start_time > 0 else 0
+    return {
         "exercise_name": state['exercise'],
         "total_reps": state['total_good_reps'],
         "total_sets": state['current_set'],
         "best_quality": state['best_rep_quality'],
         "average_quality": state['rep_quality_score'],
         "calories": round(state['calories_burned'], 1),
-        "duration": workout_duration,
+        "duration": duration,
         "average_rep_time": round(state['average_rep_time'], 2) if state['average_rep_time'] > 0 else 0,
         "form_score": state['form_score'],
         "message": f"Workout complete! {state['total_good_reps']} quality reps! 🎉",
         # NEW: Detailed form analysis
-        "form_scores": avg_scores,
+        "form_scores": average_form_scores(rep_history, state.get('detailed_scores', {}).get('overall', 100)),
         "injury_alerts": state.get('injury_risks', []),
+        "injury_counts": dict(state['injury_counts']),
         "rep_data": rep_history
     }
+
+# -----------------------------
+# Per-user rollups (cross-session trends)
+# -----------------------------
+rollup_store = RollupStore() if USER_ROLLUP_DB else None
+user_resolver = UserResolver(NODEJS_BACKEND_URL)
+
+def identify_user(exercise):
+    """(user id, form trend) of the requesting user, seeded from their history.
+
+    Resolved before the capture starts, so a bad token can't fail a request
+    whose session is already running.
+    """
+    auth_header = request.headers.get('Authorization')
+    user_id = user_resolver.user_id(auth_header) if rollup_store and auth_header else None
+    return user_id, rollup_store.form_trend(user_id, exercise) if user_id else 'stable'
+
+def record_user_rollups(segments, auth_header):
+    """Fold each finished exercise into the user's daily and weekly rollups"""
+    if rollup_store is None:
+        return
+    user_id = user_resolver.user_id(auth_header)
+    if not user_id:
+        return
+    for segment in segments:
+        rollup_store.record_session(user_id, segment)
+
+# -----------------------------
+# Circuit sessions
+# -----------------------------
+def movement_features(landmarks):
+    """Per-frame features for the movement classifier: elbow angle, knee angle, torso horizontal"""
+    def point(name):
+        landmark = landmarks[getattr(mp_pose.PoseLandmark, name).value]
+        return [landmark.x, landmark.y]
+
+    shoulder, hip = point('RIGHT_SHOULDER'), point('RIGHT_HIP')
+    elbow_angle = calculate_angle(shoulder, point('RIGHT_ELBOW'), point('RIGHT_WRIST'))
+    knee_angle = calculate_angle(hip, point('RIGHT_KNEE'), point('RIGHT_ANKLE'))
+    horizontal = abs(shoulder[0] - hip[0]) > abs(shoulder[1] - hip[1])
+    return elbow_angle, knee_angle, horizontal
+
+def classify_movement(window):
+    """Which exercise the recent frames look like, or None if unclear.
+
+    Push-ups are the only movement done with a horizontal torso; upright,
+    a large knee range means squats and a large elbow range bicep curls.
+    """
+    if len(window) < window.maxlen:
+        return None
+    elbow_angles = [features[0] for features in window]
+    knee_angles = [features[1] for features in window]
+    horizontal = sum(1 for features in window if features[2]) / len(window)
+
+    elbow_range = max(elbow_angles) - min(elbow_angles)
+    knee_range = max(knee_angles) - min(knee_angles)
+    if horizontal > 0.7:
+        return 'pushup' if elbow_range >= CIRCUIT_MIN_RANGE else None
+    if horizontal < 0.3:
+        if knee_range >= CIRCUIT_MIN_RANGE:
+            return 'squat'
+        if elbow_range >= CIRCUIT_MIN_RANGE:
+            return 'bicep_curl'
+    return None
+
+def next_circuit_exercise():
+    circuit = state['circuit']
+    remaining = [e for e in circuit['exercises'] if e not in circuit['completed'] and e != state['exercise']]
+    return remaining[0] if remaining else None
+
+def switch_exercise(exercise, reason):
+    """Swap the active exercise between two frames (capture thread only)"""
+    now = time.time()
+    circuit = state['circuit']
+    previous = state['exercise']
+    circuit['segments'].append(summarize_exercise(state['exercise_start_time'], now))
+    if state['exercise_complete'] and previous not in circuit['completed']:
+        circuit['completed'].append(previous)
+    circuit['transitions'].append({
+        'from': previous,
+        'to': exercise,
+        'reason': reason,
+        'at': round(now - state['workout_start_time'], 1)
+    })
+
+    reset_exercise_state(exercise, now)
+    state['movement_window'].clear()
+    state['detected_exercise'] = None
+    state['detect_streak'] = 0
+
+    rest = WORKOUT_PLAN[previous]['rest'] if reason == 'completed' else 0
+    if rest:
+        state['in_rest'] = True
+        state['rest_end_time'] = now + rest
+        state['feedback'] = f"{get_random_message('set_complete')} Next up: {exercise.replace('_', ' ').title()} in {rest}s"
+    else:
+        state['feedback'] = f"🔄 Switching to {exercise.replace('_', ' ').title()}! {get_random_message('start')}"
+    print(f"🔄 Circuit: {previous} -> {exercise} ({reason})")
+
+def update_circuit(landmarks):
+    """Apply queued, completed or detected exercise changes (capture thread only)"""
+    circuit = state['circuit']
+
+    if state['exercise_complete']:
+        upcoming = next_circuit_exercise()
+        if upcoming:
+            switch_exercise(upcoming, 'completed')
+            return
+
+    if not circuit['auto_detect'] or landmarks is None:
+        return
+    state['movement_window'].append(movement_features(landmarks))
+    detected = classify_movement(state['movement_window'])
+    if detected not in circuit['exercises'] or detected == state['exercise']:
+        state['detected_exercise'] = None
+        state['detect_streak'] = 0
+        return
+    if detected == state['detected_exercise']:
+        state['detect_streak'] += 1
+    else:
+        state['detected_exercise'] = detected
+        state['detect_streak'] = 1
+    if state['detect_streak'] >= CIRCUIT_DETECT_HOLD:
+        switch_exercise(detected, 'detected')
+
+def circuit_summary(summary_now):
+    """One combined summary over every exercise segment of the circuit"""
+    circuit = state['circuit']
+    segments = circuit['segments'] + [summary_now]
+    rep_data = [dict(rep, exercise=segment['exercise_name']) for segment in segments for rep in segment['rep_data']]
+    rep_times = [segment['average_rep_time'] for segment in segments if segment['average_rep_time']]
+    total_reps = sum(segment['total_reps'] for segment in segments)
+    return {
+        "exercise_name": "circuit",
+        "total_reps": total_reps,
+        "total_sets": sum(segment['total_sets'] for segment in segments),
+        "best_quality": max(segment['best_quality'] for segment in segments),
+        "average_quality": int(sum(rep['score'] for rep in rep_data) / len(rep_data)) if rep_data else 0,
+        "calories": round(sum(segment['calories'] for segment in segments), 1),
+        "duration": int(time.time() - state['workout_start_time']) if state['workout_start_time'] > 0 else 0,
+        "average_rep_time": round(sum(rep_times) / len(rep_times), 2) if rep_times else 0,
+        "form_score": summary_now['form_score'],
+        "message": f"Circuit complete! {total_reps} quality reps across {len(segments)} exercises! 🎉",
+        "form_scores": average_form_scores(rep_data, summary_now['form_scores']['overall']),
+        "injury_alerts": [alert for segment in segments for alert in segment['injury_alerts']],
+        "rep_data": rep_data,
+        "exercises": segments,
+        "completed": circuit['completed'],
+        "transitions": circuit['transitions']
+    }
+
+def circuit_status():
+    circuit = state['circuit']
+    if not circuit:
+        return None
+    return {
+        "exercises": circuit['exercises'],
+        "current": state['exercise'],
+        "completed": circuit['completed'],
+        "auto_detect": circuit['auto_detect'],
+        "transitions": len(circuit['transitions']),
+        "detected_exercise": state['detected_exercise']
+    }
+
+# -----------------------------
+# Shared session state (multiple worker processes)
+# -----------------------------
+session_store = open_store()
+SESSION_NOT_FOUND = object()
+FORWARDED_HEADERS = ('Authorization', 'Content-Type', 'X-Session-Id')
+
+def worker_load():
+    return {
+        'sessions': 1 if state['is_running'] else 0,
+        'session_id': state['session_id'] if state['is_running'] else None
+    }
+
+def run_forwarded(command):
+    """Replay a request another worker forwarded here against this worker's routes"""
+    headers = dict(command['headers'], **{'X-Forwarded-Worker': command['from']})
+    with app.test_client() as client:
+        response = client.open(
+            command['path'],
+            method=command['method'],
+            query_string=command['query'],
+            headers=headers,
+            data=decode_body(command['body'])
+        )
+        return {
+            'status': response.status_code,
+            'mimetype': response.mimetype,
+            'headers': {key: value for key, value in response.headers if key == 'Content-Disposition'},
+            'body': encode_body(response.get_data())
+        }
+
+worker_agent = WorkerAgent(session_store, worker_load, run_forwarded)
+
+def requested_session_id():
+    """Session named by ?session= or X-Session-Id, else the last one started anywhere"""
+    session_id = request.args.get('session') or request.headers.get('X-Session-Id')
+    if session_id:
+        return session_id
+    current = session_store.get('current_session')
+    return current.decode() if current else state['session_id']
+
+def session_owner():
+    """Worker to run this request on: None for this worker, SESSION_NOT_FOUND if the session is gone"""
+    session_id = requested_session_id()
+    if not session_store.shared or request.headers.get('X-Forwarded-Worker') or session_id in (None, state['session_id']):
+        return None
+    owner = session_store.get(f"sessions/{session_id}/owner")
+    owner = owner.decode() if owner else None
+    if owner and owner != worker_agent.id and owner in worker_agent.live_workers():
+        return owner
+    # Unknown or orphaned session: clients that named it get a 404, legacy clients the local state
+    explicit = request.args.get('session') or request.headers.get('X-Session-Id')
+    return SESSION_NOT_FOUND if explicit else None
+
+def forward_request(worker_id):
+    """Run the current request on `worker_id` and relay its response"""
+    command = {
+        'from': worker_agent.id,
+        'method': request.method,
+        'path': request.path,
+        'query': request.query_string.decode(),
+        'headers': {key: request.headers[key] for key in FORWARDED_HEADERS if key in request.headers},
+        'body': encode_body(request.get_data())
+    }
+    try:
+        reply = worker_agent.send(worker_id, command)
+    except ForwardError as e:
+        print(f"❌ {str(e)}")
+        return jsonify({"error": str(e)}), 504
+    return Response(decode_body(reply['body']), status=reply['status'], mimetype=reply['mimetype'],
+                    headers=reply['headers'])
+
+def on_session_owner(view):
+    """Route the request to the worker whose capture pipeline runs the session"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        owner = session_owner()
+        if owner is SESSION_NOT_FOUND:
+            return jsonify({"error": "Session not found"}), 404
+        if owner:
+            return forward_request(owner)
+        return view(*args, **kwargs)
+    return wrapper
+
+def on_least_loaded_worker(view):
+    """Start new sessions on the live worker with the fewest sessions, then the least CPU"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if session_store.shared and not request.headers.get('X-Forwarded-Worker'):
+            target = worker_agent.least_loaded()
+            if target != worker_agent.id:
+                return forward_request(target)
+        return view(*args, **kwargs)
+    return wrapper
+
+def publish_session(now, frame=None):
+    """Owner side: latest frame every call, the /status snapshot every SESSION_PUBLISH_INTERVAL"""
+    if not session_store.shared or state['session_id'] is None:
+        return
+    key = f"sessions/{state['session_id']}"
+    if frame is not None:
+        state['frame_seq'] += 1
+        session_store.put(f"{key}/frame", state['frame_seq'].to_bytes(8, 'big') + frame)
+    if frame is None or now - state['last_publish_time'] >= SESSION_PUBLISH_INTERVAL:
+        state['last_publish_time'] = now
+        put_json(session_store, f"{key}/status", status_payload())
+
+def end_published_session():
+    """Final snapshot once the pipeline stops; viewers on other workers end their streams"""
+    if session_store.shared and state['session_id']:
+        session_store.delete(f"sessions/{state['session_id']}/frame")
+        publish_session(time.time())
+
+def claim_session():
+    """New session id owned by this worker; the previous session's keys are dropped"""
+    old = state['session_id']
+    if session_store.shared and old:
+        for name in ('status', 'frame', 'owner'):
+            session_store.delete(f"sessions/{old}/{name}")
+    state['session_id'] = uuid.uuid4().hex[:12]
+    state['frame_seq'] = 0
+    session_store.put(f"sessions/{state['session_id']}/owner", worker_agent.id.encode())
+    session_store.put('current_session', state['session_id'].encode())
+
+def shared_frames(session_id):
+    """MJPEG parts for a session running on another worker, read from the store"""
+    last_seq = None
+    while True:
+        data = session_store.get(f"sessions/{session_id}/frame")
+        if data is None:
+            snapshot = get_json(session_store, f"sessions/{session_id}/status")
+            if snapshot is None or not snapshot['is_running']:
+                return
+        elif data[:8] != last_seq:
+            last_seq = data[:8]
+            yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + data[8:] + b'\r\n')
+            continue
+        time.sleep(0.01)
+
+# -----------------------------
+# Capture supervisor
+# -----------------------------
+def open_capture_source():
+    """Open the configured camera (numeric index, stream URL/path, or "synthetic")"""
+    if CAMERA_INDEX == 'synthetic':
+        # Paced fake frames with scripted landmarks, for load tests without a camera
+        from synthetic_source import SyntheticCapture
+        return SyntheticCapture(lambda: state['exercise'])
+    source = int(CAMERA_INDEX) if CAMERA_INDEX.isdigit() else CAMERA_INDEX
+    return cv2.VideoCapture(source)
+
+def wait_while_running(seconds):
+    """Sleep in short slices so /stop is never blocked by a backoff"""
+    deadline = time.time() + seconds
+    while state['is_running'] and time.time() < deadline:
+        time.sleep(min(0.1, max(0, deadline - time.time())))
+
+def stop_capture_session(reason, feedback):
+    """Stop the running session from inside the capture thread"""
+    state['is_running'] = False
+    state['source_health'] = 'failed'
+    state['stop_reason'] = reason
+    state['feedback'] = feedback
+    print(f"❌ Capture stopped: {reason}")
+
+def supervise_read_failure(cap, backoff):
+    """Handle a failed read: pause, reopen the source with backoff, or give up.
+
+    Returns the (possibly reopened) capture and the next backoff delay.
+    """
+    state['read_failures'] += 1
+    state['consecutive_read_failures'] += 1
+
+    if time.time() - state['last_frame_time'] > CAPTURE_STALL_TIMEOUT:
+        stop_capture_session(
+            'source_timeout',
+            f"📷 Camera unavailable for {int(CAPTURE_STALL_TIMEOUT)}s - session stopped. Check your camera!"
+        )
+        return cap, backoff
+
+    if state['consecutive_read_failures'] < CAPTURE_MAX_READ_FAILURES:
+        state['source_health'] = 'degraded'
+        time.sleep(CAPTURE_FAILURE_SLEEP)
+        return cap, backoff
+
+    # Too many failures in a row - release and reopen the source
+    state['source_health'] = 'reconnecting'
+    print(f"⚠️ Camera read failed {state['consecutive_read_failures']} times, reconnecting in {backoff:.1f}s")
+    cap.release()
+    wait_while_running(backoff)
+    if not state['is_running']:
+        return cap, backoff
+
+    cap = open_capture_source()
+    state['reconnect_count'] += 1
+    state['consecutive_read_failures'] = 0
+    return cap, min(backoff * 2, CAPTURE_BACKOFF_MAX)
+
+# -----------------------------
+# Pose estimator selection
+# -----------------------------
+def select_pose_backend(cap):
+    """POSE_BACKEND, or for auto the fastest backend that meets the accuracy floor on this host.
+
+    The auto benchmark runs on the first POSE_BENCHMARK_FRAMES frames of a
+    session (the real camera and person); the result is kept for the rest of
+    the process once there was a person to judge accuracy on.
+    """
+    if POSE_BACKEND != 'auto':
+        return POSE_BACKEND
+    if state['pose_auto_backend']:
+        return state['pose_auto_backend']
+    if getattr(cap, 'scripted_pose', None):
+        return 'mediapipe'  # scripted landmarks, nothing to benchmark
+
+    frames = []
+    while len(frames) < POSE_BENCHMARK_FRAMES and state['is_running']:
+        ok, frame = cap.read() if cap.isOpened() else (False, None)
+        if not ok:
+            break
+        frames.append(cv2.cvtColor(cv2.flip(frame, 1), cv2.COLOR_BGR2RGB))
+    if not frames:
+        return 'mediapipe'
+
+    feedback = state['feedback']
+    state['feedback'] = "⚙️ Tuning pose tracking for this device..."
+    results = benchmark_backends(frames)
+    backend = choose_backend(results)
+    state['pose_benchmark'] = results
+    if any(result.get('accuracy') is not None for result in results.values()):
+        state['pose_auto_backend'] = backend
+    print(f"🏁 Pose backend: {backend} ({json.dumps(results)})")
+    state['feedback'] = feedback
+    return backend
+
+# -----------------------------
+# Video capture thread
+# -----------------------------
+def open_pose_estimator(name):
+    """(backend name, estimator); a backend that can't start falls back to mediapipe"""
+    try:
+        return name, create_estimator(name)
+    except Exception as e:
+        if name == 'mediapipe':
+            raise
+        print(f"⚠️ Pose backend {name} unavailable ({str(e)}), falling back to mediapipe")
+        return 'mediapipe', create_estimator('mediapipe')
+
+def capture_frames():
+    cap = open_capture_source()
+    try:
+        last_time = time.time()
+        backoff = CAPTURE_BACKOFF_INITIAL
+        state['last_frame_time'] = last_time
+        state['pose_backend'], pose = open_pose_estimator(select_pose_backend(cap))
+
+        with pose:
+            while state['is_running']:
+                ok, frame = cap.read() if cap.isOpened() else (False, None)
+                if not ok:
+                    cap, backoff = supervise_read_failure(cap, backoff)
+                    continue
+
+                state['last_frame_time'] = time.time()
+                state['consecutive_read_failures'] = 0
+                state['source_health'] = 'ok'
+                backoff = CAPTURE_BACKOFF_INITIAL
+
+                # Exercise swaps requested over HTTP land between frames, never mid-frame
+                pending = state['pending_exercise']
+                if pending and state['circuit']:
+                    state['pending_exercise'] = None
+                    switch_exercise(pending, 'command')
+
+                frame = cv2.flip(frame, 1)
+                image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                scripted_pose = getattr(cap, 'scripted_pose', None)
+                results = scripted_pose() if scripted_pose else pose.process(image)
+
+                if results.pose_landmarks:
+                    process_pose(results.pose_landmarks.landmark, state['exercise'])
+                    mp_drawing.draw_landmarks(frame, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
+                    if SESSION_TRACE_MAX_FRAMES:
+                        record_frame_columns(time.time())
+                if state['circuit']:
+                    update_circuit(results.pose_landmarks.landmark if results.pose_landmarks else None)
+
+                # Display enhanced information
+                # cv2.putText(frame, f"Reps: {state['reps']} (Set {state['current_set']}/{state['total_sets']})",
+                            # (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
+            
+                # Quality indicator
+                quality_color = (0, 255, 0) if state['rep_quality_score'] > 75 else (0, 165, 255) if state['rep_quality_score'] > 50 else (0, 0, 255)
+                # cv2.putText(frame, f"Quality: {state['rep_quality_score']}/100", 
+                #             (20, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.7, quality_color, 2)
+            
+                # Feedback with word wrapping for long messages
+                feedback_lines = [state['feedback'][i:i+50] for i in range(0, len(state['feedback']), 50)]
+                # for i, line in enumerate(feedback_lines[:2]):  # Max 2 lines
+                #     cv2.putText(frame, line, (20, 80 + i*25),
+                #                 cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0,255,0), 2)
+
+                # Encoding happens per rung when a viewer asks, not here
+                ladder = state['video_ladder']
+                ladder.publish(frame)
+
+                current_time = time.time()
+                state['fps'] = round(1 / (current_time - last_time), 1)
+                last_time = current_time
+                if session_store.shared:
+                    publish_session(current_time, ladder.jpeg(0, ladder.seq, frame)[1])
+
+    except Exception as e:
+        # Never let the thread die silently with the session still marked running
+        print(f"❌ Capture thread error: {str(e)}")
+        stop_capture_session('capture_error', f"❌ Tracking stopped: {str(e)}")
+    finally:
+        cap.release()
+        cv2.destroyAllWindows()
+        state['video_ladder'].close()
+        end_published_session()
+
+# -----------------------------
+# Enhanced API Endpoints
+# -----------------------------
+def start_session(exercise, circuit=None, user=(None, 'stable')):
+    """(Re)start the capture pipeline for `exercise`, optionally as a circuit, for `user` from identify_user()"""
+    t_old = state.get('capture_thread')
+    if t_old and t_old.is_alive():
+        state['is_running'] = False
+        t_old.join()
+    state['video_ladder'].close()
+
+    now = time.time()
+    reset_exercise_state(exercise, now)
+    state.update({
+        'is_running': True,
+        'feedback': f"{get_random_message('start')} Starting {exercise.title()}!",
+        'workout_start_time': now,
+        'total_workout_time': 0,
+        'video_ladder': FrameLadder(),
+        'fps': 0,
+        'source_health': 'ok',
+        'reconnect_count': 0,
+        'read_failures': 0,
+        'consecutive_read_failures': 0,
+        'last_frame_time': now,
+        'stop_reason': None,
+        'circuit': circuit,
+        'pending_exercise': None,
+        'detected_exercise': None,
+        'detect_streak': 0,
+        'rep_columns': new_rep_columns(),
+        'frame_columns': new_frame_columns(),
+        'user_id': user[0],
+        'form_trend': user[1]
+    })
+    state['movement_window'].clear()
+
+    claim_session()
+
+    t = threading.Thread(target=capture_frames, daemon=True)
+    t.start()
+    state['capture_thread'] = t
+    if session_store.shared:
+        # Count the new session right away so the next placement skips this worker
+        worker_agent.heartbeat()
+
+@app.route("/start/<exercise>", methods=["POST"])
+@on_least_loaded_worker
+def start(exercise):
+    if exercise not in EXERCISE_CONFIG:
+        return jsonify({"error": "Invalid exercise"}), 400
+
+    start_session(exercise, user=identify_user(exercise))
+
+    return jsonify({
+        "status": "started", 
+        "session_id": state['session_id'],
+        "plan": WORKOUT_PLAN[exercise],
+        "message": f"Let's crush this {exercise} workout! 💪"
+    })
+
+@app.route("/circuit/start", methods=["POST"])
+@on_least_loaded_worker
+def start_circuit():
+    """Run several exercises on one continuous capture session"""
+    body = request.get_json(silent=True) or {}
+    exercises = body.get('exercises') or list(WORKOUT_PLAN)
+    invalid = [e for e in exercises if e not in EXERCISE_CONFIG]
+    if invalid or len(set(exercises)) != len(exercises):
+        return jsonify({"error": f"Invalid circuit: {invalid or 'duplicate exercises'}"}), 400
+
+    circuit = {
+        'exercises': exercises,
+        'auto_detect': bool(body.get('auto_detect', True)),
+        'completed': [],
+        'segments': [],
+        'transitions': []
+    }
+    start_session(exercises[0], circuit, identify_user(exercises[0]))
+
+    return jsonify({
+        "status": "started",
+        "session_id": state['session_id'],
+        "circuit": exercises,
+        "plan": {e: WORKOUT_PLAN[e] for e in exercises},
+        "auto_detect": circuit['auto_detect'],
+        "message": f"Circuit time! Starting with {exercises[0].replace('_', ' ').title()} 💪"
+    })
+
+@app.route("/circuit/next", methods=["POST"])
+@on_session_owner
+def next_exercise():
+    """Queue a switch to the given (or next) circuit exercise; applied on the next frame"""
+    if not state['is_running'] or not state['circuit']:
+        return jsonify({"error": "No circuit running"}), 400
+
+    body = request.get_json(silent=True) or {}
+    exercise = body.get('exercise') or next_circuit_exercise()
+    if exercise not in state['circuit']['exercises']:
+        return jsonify({"error": f"{exercise} is not part of this circuit"}), 400
+
+    state['pending_exercise'] = exercise
+    return jsonify({"status": "switching", "exercise": exercise})
+
+@app.route("/stop", methods=["POST"])
+@on_session_owner
+def stop():
+    state['is_running'] = False
+    t = state.get('capture_thread')
+    if t and t.is_alive():
+        t.join()
+    state['capture_thread'] = None
+    if state['source_health'] != 'failed':
+        state['source_health'] = 'idle'
+    end_published_session()
+    
+    # Provide detailed workout summary
+    summary = summarize_exercise(state['exercise_start_time'], time.time())
+    segments = [summary]
+    if state['circuit']:
+        summary = circuit_summary(summary)
+        # The backend stores one workout per exercise; skip exercises that got no reps
+        segments = [segment for segment in summary['exercises'] if segment['total_reps'] > 0]
     
     # Get user token from request headers and save to backend
     auth_header = request.headers.get('Authorization')
     if auth_header:
         try:
-            # Save performance data (existing)
-            save_to_backend(summary, auth_header)
-            # Save form analysis data (new)
-            save_form_analysis(summary, auth_header)
+            record_user_rollups(segments, auth_header)
+        except Exception as e:
+            print(f"Failed to update user rollups: {e}")
+        try:
+            for segment in segments:
+                # Save performance data (existing)
+                save_to_backend(segment, auth_header)
+                # Save form analysis data (new)
+                save_form_analysis(segment, auth_header)
         except Exception as e:
             print(f"Failed to save to backend: {e}")
     
-    return jsonify({"status": "stopped", "summary": summary})
+    return jsonify({
+        "status": "stopped",
+        "summary": compact_summary(summary),
+        "export": {
+            "url": "/session/export",
+            "reps": len(state['rep_columns']['rep_number']),
+            "frames": len(state['frame_columns']['time'])
+        }
+    })
+
+@app.route("/session/export")
+@on_session_owner
+def session_export():
+    """Per-rep data (and per-frame traces) of the current or last session, columnar.
+
+    ?format=npz (default) returns every column in one compressed .npz;
+    ?format=arrow returns one table (?table=reps|frames) as an Arrow IPC stream.
+    """
+    export_format = request.args.get('format', 'npz')
+    if export_format == 'arrow':
+        if pa is None:
+            return jsonify({"error": "Arrow export needs pyarrow installed"}), 501
+        table_name = request.args.get('table', 'reps')
+        if table_name not in ('reps', 'frames'):
+            return jsonify({"error": "table must be reps or frames"}), 400
+        return Response(export_arrow(table_name), mimetype="application/vnd.apache.arrow.stream")
+    if export_format != 'npz':
+        return jsonify({"error": "format must be npz or arrow"}), 400
+
+    include_frames = request.args.get('frames', '1') != '0'
+    return Response(
+        export_npz(include_frames),
+        mimetype="application/octet-stream",
+        headers={"Content-Disposition": "attachment; filename=session.npz"}
+    )
+
+@app.route("/session/upload", methods=["POST"])
+@on_session_owner
+def session_upload():
+    """Bulk-upload the session export to SESSION_UPLOAD_URL in a single request"""
+    if not SESSION_UPLOAD_URL:
+        return jsonify({"error": "SESSION_UPLOAD_URL is not configured"}), 501
+    auth_header = request.headers.get('Authorization')
+    if not auth_header:
+        return jsonify({"error": "Authorization header required"}), 401
+
+    payload = export_npz(request.args.get('frames', '1') != '0')
+    try:
+        response = requests.post(
+            SESSION_UPLOAD_URL,
+            files={"session": ("session.npz", payload, "application/octet-stream")},
+            headers={'Authorization': auth_header},
+            timeout=30
+        )
+    except Exception as e:
+        print(f"❌ Error uploading session export: {str(e)}")
+        return jsonify({"error": str(e)}), 502
+
+    if response.status_code not in [200, 201]:
+        print(f"❌ Failed to upload session export: {response.status_code} - {response.text}")
+        return jsonify({"error": f"Upload failed with {response.status_code}"}), 502
+    print(f"✅ Session export uploaded ({len(payload)} bytes)")
+    return jsonify({"status": "uploaded", "bytes": len(payload)})
 
 def save_to_backend(summary, auth_token):
     """Save workout performance data to Node.js backend"""
@@ -851,6 +1827,7 @@ def save_form_analysis(summary, auth_token):
         return False
 
 @app.route("/reset", methods=["POST"])
+@on_session_owner
 def reset():
     state.update({
         'reps': 0,
@@ -868,28 +1845,55 @@ def reset():
         'form_issues': [],
         'last_feedback_time': 0,
         'average_rep_time': 0,
-        'best_rep_quality': 0
+        'best_rep_quality': 0,
+        'rep_kinematics': new_rep_kinematics(),
+        'last_rep_kinematics': None,
+        'injury_counts': {}
     })
     state['angle_history'].clear()
     state['rep_times'].clear()
+    state['landmark_ring'].clear()
+    publish_session(time.time())
     return jsonify({"status": "reset", "message": "Ready for another round! 🔥"})
 
 @app.route("/video_feed")
 def video_feed():
+    owner = session_owner()
+    if owner is SESSION_NOT_FOUND:
+        return "Session not found", 404
+    if owner:
+        # Frames come from the owner through the store; no hop per frame
+        return Response(shared_frames(requested_session_id()), mimetype="multipart/x-mixed-replace; boundary=frame")
     if not state['is_running']:
         return "Stream not running", 400
 
+    # ?rung=N pins a ladder rung (0 = full quality); otherwise it adapts to the viewer's link
+    rung = request.args.get('rung', type=int)
+    ladder = state['video_ladder']
+    limit_send_buffer(request.environ)
+
     def generate():
-        while state['is_running']:
-            if state['latest_frame'] is None:
-                continue
-            yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + state['latest_frame'] + b'\r\n')
+        pacer = ViewerPacer(ladder, rung)
+        seq = 0
+        try:
+            while not ladder.closed:
+                new_seq, frame = ladder.wait(seq)
+                if new_seq == seq:
+                    continue
+                skipped = new_seq - seq - 1 if seq else 0
+                seq = new_seq
+                seq, jpeg = ladder.jpeg(pacer.rung, seq, frame)
+                sent = time.perf_counter()
+                yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+                pacer.record(len(jpeg), time.perf_counter() - sent, skipped)
+        finally:
+            pacer.close()
 
     return Response(generate(), mimetype="multipart/x-mixed-replace; boundary=frame")
 
-@app.route("/status")
-def status():
-    return jsonify({
+def status_payload():
+    return {
+        "session_id": state['session_id'],
         "exercise": state['exercise'],
         "set": state['current_set'],
         "total_sets": state['total_sets'],
@@ -911,7 +1915,84 @@ def status():
         # NEW: Detailed form analysis
         "detailed_scores": state.get('detailed_scores', {}),
         "injury_alert": state.get('active_injury_alert'),
-        "form_trend": state.get('form_trend', 'stable')
+        "form_trend": state.get('form_trend', 'stable'),
+        # Capture source health
+        "is_running": state['is_running'],
+        "source_health": state['source_health'],
+        "reconnect_count": state['reconnect_count'],
+        "stop_reason": state['stop_reason'],
+        "circuit": circuit_status(),
+        "kinematics": kinematics_status()
+    }
+
+@app.route("/status")
+def status():
+    owner = session_owner()
+    if owner is SESSION_NOT_FOUND:
+        return jsonify({"error": "Session not found"}), 404
+    if owner:
+        snapshot = get_json(session_store, f"sessions/{requested_session_id()}/status")
+        return jsonify(snapshot) if snapshot is not None else forward_request(owner)
+    return jsonify(status_payload())
+
+@app.route("/metrics")
+def metrics():
+    """Capture pipeline counters for monitoring"""
+    last_frame_age = time.time() - state['last_frame_time'] if state['last_frame_time'] else None
+    return jsonify({
+        "is_running": state['is_running'],
+        "fps": state['fps'],
+        "capture": {
+            "source_health": state['source_health'],
+            "reconnect_count": state['reconnect_count'],
+            "read_failures": state['read_failures'],
+            "consecutive_read_failures": state['consecutive_read_failures'],
+            "last_frame_age": round(last_frame_age, 2) if last_frame_age is not None else None,
+            "stop_reason": state['stop_reason']
+        },
+        "video": state['video_ladder'].stats(),
+        "pose": {
+            "backend": state['pose_backend'],
+            "benchmark": state['pose_benchmark']
+        },
+        "worker": {
+            "id": worker_agent.id,
+            "store": SESSION_STORE,
+            "session_id": state['session_id'],
+            "live_workers": len(worker_agent.live_workers()) if session_store.shared else 1
+        }
+    })
+
+@app.route("/trends")
+def trends():
+    """Cross-session form trends for the signed-in user, served from the local rollups.
+
+    ?period=day|week (default week), ?exercise= to narrow to one exercise,
+    ?limit= number of most recent buckets (default 8).
+    """
+    if rollup_store is None:
+        return jsonify({"error": "USER_ROLLUP_DB is not configured"}), 501
+    user_id = user_resolver.user_id(request.headers.get('Authorization'))
+    if not user_id:
+        return jsonify({"error": "Valid Authorization header required"}), 401
+
+    period = request.args.get('period', 'week')
+    exercise = request.args.get('exercise')
+    if period not in PERIODS:
+        return jsonify({"error": f"period must be one of {list(PERIODS)}"}), 400
+    if exercise and exercise not in EXERCISE_CONFIG:
+        return jsonify({"error": "Invalid exercise"}), 400
+    limit = max(1, min(request.args.get('limit', 8, type=int), 366))
+
+    started = time.perf_counter()
+    buckets = rollup_store.trend(user_id, period, exercise, limit)
+    form_trend = rollup_store.form_trend(user_id, exercise, period)
+    return jsonify({
+        "period": period,
+        "exercise": exercise,
+        "form_trend": form_trend,
+        "buckets": buckets,
+        "query_ms": round((time.perf_counter() - started) * 1000, 2)
     })
 
 @app.route("/motivation", methods=["POST"])
@@ -924,6 +2005,10 @@ def get_motivation():
         "type": message_type
     })
 
+# Workers sharing a store heartbeat and take forwarded requests once every route exists
+if session_store.shared:
+    worker_agent.start()
+
 if __name__ == "__main__":
     port = int(os.environ.get('PORT', 5000))
     debug_mode = os.environ.get('FLASK_ENV') != 'production'
@@ -0,0 +1,272 @@
+"""Capacity test for the Flask tracking service.
+
+Starts `app.py` in a subprocess with the synthetic capture source
+(CAMERA_INDEX=synthetic, no camera needed), then ramps up clients for each
+scenario in turn:
+
+  status      clients polling GET /status
+  video_feed  viewers reading the MJPEG stream from GET /video_feed
+  start_stop  clients cycling POST /start/<exercise> and POST /stop
+
+For every scenario and client count it records throughput, latency
+percentiles and errors, plus the server process's CPU and memory while
+that stage ran. Video stages also report delivered frames per second per
+viewer. The JSON report can be kept per release and compared:
+
+    python load_test.py --levels 1,8,32 --duration 10 --out capacity.json
+    python load_test.py --scenarios video_feed --levels 1,2,4,8
+    python load_test.py --url http://127.0.0.1:5000 --pid 1234   # existing server
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SCENARIOS = ('status', 'video_feed', 'start_stop')
+FRAME_BOUNDARY = b'--frame'
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p90": None, "p99": None, "max": None}
+    values = sorted(values)
+
+    def pick(fraction):
+        return round(values[min(len(values) - 1, int(fraction * len(values)))] * 1000, 2)
+
+    return {"p50": pick(0.50), "p90": pick(0.90), "p99": pick(0.99), "max": round(values[-1] * 1000, 2)}
+
+
+class ProcessSampler:
+    """Samples CPU% and RSS of the server process on a background thread"""
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _cpu_seconds_and_rss(self):
+        if psutil is not None:
+            process = psutil.Process(self.pid)
+            times = process.cpu_times()
+            return times.user + times.system, process.memory_info().rss
+        # Linux fallback without psutil
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf('SC_CLK_TCK')
+        cpu = (int(fields[11]) + int(fields[12])) / ticks
+        with open(f"/proc/{self.pid}/status") as f:
+            rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        return cpu, rss_kb * 1024
+
+    def _run(self):
+        last_cpu, _ = self._cpu_seconds_and_rss()
+        last_time = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            cpu, rss = self._cpu_seconds_and_rss()
+            now = time.perf_counter()
+            self.samples.append(((cpu - last_cpu) / (now - last_time) * 100, rss))
+            last_cpu, last_time = cpu, now
+
+    def __enter__(self):
+        if self.pid:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def summary(self):
+        if not self.samples:
+            return {"cpu_percent_avg": None, "cpu_percent_max": None, "rss_mb_max": None}
+        cpu = [sample[0] for sample in self.samples]
+        return {
+            "cpu_percent_avg": round(sum(cpu) / len(cpu), 1),
+            "cpu_percent_max": round(max(cpu), 1),
+            "rss_mb_max": round(max(sample[1] for sample in self.samples) / 1024 / 1024, 1),
+        }
+
+
+def status_client(base_url, stop_at, result):
+    session = requests.Session()
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        try:
+            ok = session.get(f"{base_url}/status", timeout=10).status_code == 200
+        except requests.RequestException:
+            ok = False
+        result['latencies' if ok else 'errors'].append(time.perf_counter() - start)
+
+
+def video_client(base_url, stop_at, result):
+    """Reads the MJPEG stream; latency = gap between consecutive frames"""
+    start = time.perf_counter()
+    try:
+        with requests.get(f"{base_url}/video_feed", stream=True, timeout=10) as response:
+            if response.status_code != 200:
+                result['errors'].append(time.perf_counter() - start)
+                return
+            last_frame = None
+            for chunk in response.iter_content(chunk_size=65536):
+                result['bytes'] += len(chunk)
+                frames = chunk.count(FRAME_BOUNDARY)
+                now = time.perf_counter()
+                if frames:
+                    if last_frame is not None:
+                        result['latencies'].append(now - last_frame)
+                    if result['first_frame'] is None:
+                        result['first_frame'] = now - start
+                    result['frames'] += frames
+                    last_frame = now
+                if now >= stop_at:
+                    break
+    except requests.RequestException:
+        result['errors'].append(time.perf_counter() - start)
+
+
+def start_stop_client(base_url, stop_at, result, exercise):
+    session = requests.Session()
+    while time.perf_counter() < stop_at:
+        for path in (f"/start/{exercise}", "/stop"):
+            start = time.perf_counter()
+            try:
+                ok = session.post(f"{base_url}{path}", timeout=30).status_code == 200
+            except requests.RequestException:
+                ok = False
+            result['latencies' if ok else 'errors'].append(time.perf_counter() - start)
+
+
+def run_stage(base_url, scenario, clients, duration, pid, exercise):
+    results = [{'latencies': [], 'errors': [], 'frames': 0, 'bytes': 0, 'first_frame': None} for _ in range(clients)]
+    stop_at = time.perf_counter() + duration
+    targets = {
+        'status': lambda result: status_client(base_url, stop_at, result),
+        'video_feed': lambda result: video_client(base_url, stop_at, result),
+        'start_stop': lambda result: start_stop_client(base_url, stop_at, result, exercise),
+    }
+    threads = [threading.Thread(target=targets[scenario], args=(result,), daemon=True) for result in results]
+
+    with ProcessSampler(pid) as sampler:
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(duration + 30)
+        elapsed = time.perf_counter() - started
+
+    latencies = [latency for result in results for latency in result['latencies']]
+    errors = sum(len(result['errors']) for result in results)
+    stage = {
+        "scenario": scenario,
+        "clients": clients,
+        "seconds": round(elapsed, 2),
+        "errors": errors,
+        **sampler.summary(),
+    }
+    if scenario == 'video_feed':
+        frames = sum(result['frames'] for result in results)
+        first_frames = [result['first_frame'] for result in results if result['first_frame'] is not None]
+        stage.update({
+            "frames_per_sec": round(frames / elapsed, 1),
+            "frames_per_sec_per_viewer": round(frames / elapsed / clients, 1),
+            "mbytes_per_sec": round(sum(result['bytes'] for result in results) / elapsed / 1024 / 1024, 2),
+            "frame_gap_ms": percentiles(latencies),
+            "first_frame_ms": percentiles(first_frames),
+        })
+    else:
+        stage.update({
+            "requests": len(latencies) + errors,
+            "requests_per_sec": round(len(latencies) / elapsed, 1),
+            "latency_ms": percentiles(latencies),
+        })
+    return stage
+
+
+def start_server(port):
+    """Run app.py with the synthetic source; returns the process once it answers"""
+    env = dict(os.environ, PORT=str(port), CAMERA_INDEX='synthetic', FLASK_ENV='production')
+    process = subprocess.Popen(
+        [sys.executable, 'app.py'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"app.py exited with code {process.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/status", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.terminate()
+    raise TimeoutError("app.py did not start")
+
+
+def run(args):
+    base_url = args.url
+    process = None
+    pid = args.pid
+    if not base_url:
+        process = start_server(args.port)
+        base_url = f"http://127.0.0.1:{args.port}"
+        pid = process.pid
+
+    report = {"base_url": base_url, "duration": args.duration, "stages": []}
+    try:
+        idle = ProcessSampler(pid)
+        with idle:
+            time.sleep(2)
+        report["idle"] = idle.summary()
+
+        for scenario in args.scenarios.split(','):
+            # /status and /video_feed are measured against a running session
+            if scenario in ('status', 'video_feed'):
+                requests.post(f"{base_url}/start/{args.exercise}", timeout=30)
+                time.sleep(1)
+            for clients in [int(level) for level in args.levels.split(',')]:
+                stage = run_stage(base_url, scenario, clients, args.duration, pid, args.exercise)
+                print(json.dumps(stage))
+                report["stages"].append(stage)
+            requests.post(f"{base_url}/stop", timeout=30)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the Flask tracking service")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated, from {SCENARIOS}")
+    parser.add_argument("--levels", default="1,4,16", help="comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per stage")
+    parser.add_argument("--exercise", default="squat")
+    parser.add_argument("--port", type=int, default=5099, help="port for the spawned server")
+    parser.add_argument("--url", help="test an already running server instead of spawning one")
+    parser.add_argument("--pid", type=int, help="server pid for CPU/memory sampling with --url")
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    result = run(args)
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,321 @@
+"""Pose estimator backends for the capture pipeline.
+
+`capture_frames` only needs `process(rgb_image)` returning an object with
+`pose_landmarks` (a 33-landmark `NormalizedLandmarkList`, or None), which
+is what `mp.solutions.pose.Pose` returns. Every backend here produces that
+same layout, so `process_pose` and the drawing code work unchanged:
+
+  mediapipe       MediaPipe Pose, full model (the reference)
+  mediapipe_lite  MediaPipe Pose, lite model (model_complexity=0)
+  tflite          BlazePose landmark model on the TFLite runtime, multi-threaded
+  onnx            the same model exported to ONNX, on ONNX Runtime, multi-threaded
+
+The TFLite backend defaults to the `pose_landmark_full.tflite` that ships
+inside the mediapipe package and needs `ai-edge-litert` (or
+`tflite-runtime`); the ONNX backend needs `onnxruntime` and
+POSE_ONNX_MODEL pointing at an exported landmark model. Both run the
+single-person landmark model without a separate detector: the whole frame
+first, then a rotated square around the previous frame's pose.
+
+POSE_BACKEND=auto benchmarks the available backends on real frames and
+keeps the fastest one whose keypoints match the reference closely enough
+(POSE_ACCURACY_FLOOR). To compare backends on a recording:
+
+    python pose_backends.py --source workout.mp4 --frames 60
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import time
+
+import cv2
+import mediapipe as mp
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+try:
+    import onnxruntime as ort  # optional: onnx backend
+except ImportError:
+    ort = None
+
+try:
+    from ai_edge_litert.interpreter import Interpreter as TFLiteInterpreter  # optional: tflite backend
+except ImportError:
+    try:
+        from tflite_runtime.interpreter import Interpreter as TFLiteInterpreter
+    except ImportError:
+        TFLiteInterpreter = None
+
+POSE_BACKEND = os.environ.get('POSE_BACKEND', 'mediapipe')  # a name from BACKENDS, or auto
+POSE_THREADS = int(os.environ.get('POSE_THREADS', os.cpu_count() or 1))  # tflite/onnx inference threads
+POSE_TFLITE_MODEL = os.environ.get('POSE_TFLITE_MODEL', '') or os.path.join(
+    os.path.dirname(mp.__file__), 'modules', 'pose_landmark', 'pose_landmark_full.tflite')
+POSE_ONNX_MODEL = os.environ.get('POSE_ONNX_MODEL', '')
+POSE_BENCHMARK_FRAMES = int(os.environ.get('POSE_BENCHMARK_FRAMES', 30))
+POSE_ACCURACY_FLOOR = float(os.environ.get('POSE_ACCURACY_FLOOR', 0.9))  # share of reference keypoints matched
+POSE_ACCURACY_TOLERANCE = float(os.environ.get('POSE_ACCURACY_TOLERANCE', 0.05))  # normalized distance
+DETECTION_CONFIDENCE = float(os.environ.get('DETECTION_CONFIDENCE', 0.7))
+TRACKING_CONFIDENCE = float(os.environ.get('TRACKING_CONFIDENCE', 0.7))
+
+REFERENCE_BACKEND = 'mediapipe'
+# Shoulders, elbows, wrists, hips, knees and ankles: the joints exercises are scored on
+ACCURACY_KEYPOINTS = [11, 12, 13, 14, 15, 16, 23, 24, 25, 26, 27, 28]
+LANDMARK_COUNT = 33
+
+
+class PoseResult:
+    """Same shape as a mediapipe Pose result"""
+
+    def __init__(self, landmarks):
+        self.pose_landmarks = landmarks
+
+
+class PoseEstimator:
+    name = None
+
+    def process(self, image):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MediaPipePose(PoseEstimator):
+    def __init__(self, model_complexity=1):
+        self.name = 'mediapipe' if model_complexity == 1 else 'mediapipe_lite'
+        self.pose = mp.solutions.pose.Pose(
+            model_complexity=model_complexity,
+            min_detection_confidence=DETECTION_CONFIDENCE,
+            min_tracking_confidence=TRACKING_CONFIDENCE
+        )
+
+    def process(self, image):
+        return self.pose.process(image)
+
+    def close(self):
+        self.pose.close()
+
+
+class LandmarkModelPose(PoseEstimator):
+    """BlazePose landmark model (256x256 RGB in, 39 landmarks out) run on a tracked region.
+
+    Landmarks 33 (hip centre) and 34 (above the head) are alignment points:
+    like MediaPipe, the next frame's crop is centred on the hips, rotated so
+    the body is upright and sized to twice their distance plus a margin.
+    """
+    INPUT_SIZE = 256
+    ROI_SCALE = 1.25
+
+    def __init__(self):
+        self.roi = None  # (centre x, centre y, size, rotation) in image pixels
+
+    def _infer(self, tensor):
+        """(39x5 raw landmarks in crop pixels, pose presence 0..1) for a 1x256x256x3 float tensor"""
+        raise NotImplementedError
+
+    def _crop_transform(self, width, height):
+        cx, cy, size, rotation = self.roi or (width / 2, height / 2, max(width, height), 0.0)
+        scale = size / self.INPUT_SIZE
+        cos, sin = math.cos(rotation) * scale, math.sin(rotation) * scale
+        half = self.INPUT_SIZE / 2
+        # Maps crop pixels to image pixels
+        return np.array([
+            [cos, -sin, cx - cos * half + sin * half],
+            [sin, cos, cy - sin * half - cos * half]
+        ], dtype=np.float32)
+
+    def process(self, image):
+        height, width = image.shape[:2]
+        transform = self._crop_transform(width, height)
+        crop = cv2.warpAffine(image, transform, (self.INPUT_SIZE, self.INPUT_SIZE),
+                              flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_CONSTANT)
+        tensor = (crop.astype(np.float32) / 255.0)[None]
+        raw, presence = self._infer(tensor)
+        threshold = DETECTION_CONFIDENCE if self.roi is None else TRACKING_CONFIDENCE
+        if presence < threshold:
+            self.roi = None
+            return PoseResult(None)
+
+        points = raw[:, :2] @ transform[:, :2].T + transform[:, 2]
+        hip, top = points[33], points[34]
+        distance = float(np.hypot(*(top - hip)))
+        self.roi = (float(hip[0]), float(hip[1]), 2 * distance * self.ROI_SCALE,
+                    math.atan2(top[0] - hip[0], hip[1] - top[1]))
+
+        depth = raw[:, 2] * (transform[0, 0] ** 2 + transform[1, 0] ** 2) ** 0.5 / width
+        visibility = 1 / (1 + np.exp(-raw[:, 3]))
+        landmarks = landmark_pb2.NormalizedLandmarkList()
+        for i in range(LANDMARK_COUNT):
+            landmarks.landmark.add(x=float(points[i, 0] / width), y=float(points[i, 1] / height),
+                                   z=float(depth[i]), visibility=float(visibility[i]))
+        return PoseResult(landmarks)
+
+
+def _split_outputs(outputs):
+    """(landmarks, presence) from a landmark model's outputs, picked by size"""
+    landmarks = next(output for output in outputs if output.size == 39 * 5)
+    presence = next(output for output in outputs if output.size == 1)
+    return landmarks.reshape(39, 5), float(presence.reshape(-1)[0])
+
+
+class TFLitePose(LandmarkModelPose):
+    name = 'tflite'
+
+    def __init__(self, model_path=POSE_TFLITE_MODEL, threads=POSE_THREADS):
+        super().__init__()
+        if TFLiteInterpreter is None:
+            raise RuntimeError("tflite backend needs ai-edge-litert or tflite-runtime installed")
+        self.interpreter = TFLiteInterpreter(model_path=model_path, num_threads=threads)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_indices = [detail['index'] for detail in self.interpreter.get_output_details()]
+
+    def _infer(self, tensor):
+        self.interpreter.set_tensor(self.input_index, tensor)
+        self.interpreter.invoke()
+        return _split_outputs([self.interpreter.get_tensor(index) for index in self.output_indices])
+
+
+class OnnxPose(LandmarkModelPose):
+    name = 'onnx'
+
+    def __init__(self, model_path=POSE_ONNX_MODEL, threads=POSE_THREADS):
+        super().__init__()
+        if ort is None:
+            raise RuntimeError("onnx backend needs onnxruntime installed")
+        if not model_path:
+            raise RuntimeError("onnx backend needs POSE_ONNX_MODEL")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.channels_first = model_input.shape[1] == 3  # exports from PyTorch are NCHW
+
+    def _infer(self, tensor):
+        if self.channels_first:
+            tensor = np.ascontiguousarray(tensor.transpose(0, 3, 1, 2))
+        return _split_outputs(self.session.run(None, {self.input_name: tensor}))
+
+
+BACKENDS = {
+    'mediapipe': lambda: MediaPipePose(model_complexity=1),
+    'mediapipe_lite': lambda: MediaPipePose(model_complexity=0),
+    'tflite': TFLitePose,
+    'onnx': OnnxPose
+}
+
+
+def available_backends():
+    """Backends whose runtime and model are present on this host"""
+    names = ['mediapipe', 'mediapipe_lite']
+    if TFLiteInterpreter is not None and os.path.exists(POSE_TFLITE_MODEL):
+        names.append('tflite')
+    if ort is not None and POSE_ONNX_MODEL and os.path.exists(POSE_ONNX_MODEL):
+        names.append('onnx')
+    return names
+
+
+def create_estimator(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown pose backend {name!r}, choose from {list(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+def keypoints(result):
+    if result.pose_landmarks is None:
+        return None
+    landmarks = result.pose_landmarks.landmark
+    return np.array([(landmarks[i].x, landmarks[i].y) for i in ACCURACY_KEYPOINTS], dtype=np.float32)
+
+
+def run_backend(name, frames):
+    """(keypoints per frame, ms per frame) for one backend over `frames`"""
+    with create_estimator(name) as estimator:
+        estimator.process(frames[0])  # warm-up: model load, thread pools
+        points, times = [], []
+        for frame in frames:
+            start = time.perf_counter()
+            result = estimator.process(frame)
+            times.append((time.perf_counter() - start) * 1000)
+            points.append(keypoints(result))
+    return points, times
+
+
+def benchmark_backends(frames, names=None):
+    """Speed of each backend on `frames` (RGB) and accuracy against the reference.
+
+    Accuracy is the share of scored keypoints within POSE_ACCURACY_TOLERANCE
+    of the reference, over frames where the reference found a person; it is
+    None when the reference found nobody.
+    """
+    names = names or available_backends()
+    reference, reference_times = run_backend(REFERENCE_BACKEND, frames)
+    scored = [points for points in reference if points is not None]
+    results = {}
+    for name in names:
+        if name == REFERENCE_BACKEND:
+            points, times = reference, reference_times
+        else:
+            try:
+                points, times = run_backend(name, frames)
+            except Exception as e:
+                results[name] = {"error": str(e)}
+                continue
+        matched = 0
+        for expected, found in zip(reference, points):
+            if expected is not None and found is not None:
+                matched += int((np.hypot(*(found - expected).T) <= POSE_ACCURACY_TOLERANCE).sum())
+        results[name] = {
+            "ms_per_frame": round(statistics.median(times), 2),
+            "accuracy": round(matched / (len(scored) * len(ACCURACY_KEYPOINTS)), 3) if scored else None,
+            "detected_frames": sum(found is not None for found in points)
+        }
+    return results
+
+
+def choose_backend(results):
+    """Fastest backend meeting POSE_ACCURACY_FLOOR; the reference when nothing can be judged"""
+    eligible = [
+        name for name, result in results.items()
+        if result.get('accuracy') is not None and result['accuracy'] >= POSE_ACCURACY_FLOOR
+    ]
+    if not eligible:
+        return REFERENCE_BACKEND
+    return min(eligible, key=lambda name: results[name]['ms_per_frame'])
+
+
+def read_frames(source, count):
+    """Up to `count` RGB frames from a video file or camera index, flipped like the capture loop"""
+    cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    frames = []
+    while len(frames) < count:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(cv2.cvtColor(cv2.flip(frame, 1), cv2.COLOR_BGR2RGB))
+    cap.release()
+    return frames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pose estimator backends on this host")
+    parser.add_argument("--source", default="0", help="video file or camera index")
+    parser.add_argument("--frames", type=int, default=POSE_BENCHMARK_FRAMES)
+    parser.add_argument("--backends", help=f"comma-separated, default: all available of {list(BACKENDS)}")
+    args = parser.parse_args()
+
+    benchmark_frames = read_frames(args.source, args.frames)
+    if not benchmark_frames:
+        raise SystemExit(f"No frames from {args.source}")
+    benchmark = benchmark_backends(benchmark_frames, args.backends.split(',') if args.backends else None)
+    print(json.dumps({"frames": len(benchmark_frames), "backends": benchmark, "selected": choose_backend(benchmark)}, indent=2))
@@ -0,0 +1,240 @@
+"""Session state shared between Flask worker processes.
+
+The tracker keeps its live session in the process-local `state` dict, so
+with several worker processes behind a load balancer a request that lands
+on another worker would see nothing. The worker running a session's
+capture pipeline (its owner) therefore publishes the session to a store
+every worker can read:
+
+  sessions/<id>/status   the /status payload, refreshed while it runs
+  sessions/<id>/frame    latest JPEG, prefixed with its frame number
+  sessions/<id>/owner    worker id of the owner
+  current_session        last started session, for clients that send no id
+
+Every worker also runs a `WorkerAgent` thread that heartbeats its load to
+`workers/<id>` and executes commands other workers leave in its inbox.
+Requests that must run where the pipeline is (/stop, /reset, ...) are
+forwarded to the owner that way, and /start picks the least-loaded live
+worker.
+
+Stores:
+
+  SESSION_STORE=memory        single process, nothing shared (default)
+  SESSION_STORE=shm           files under /dev/shm, shared by all workers on the host
+  SESSION_STORE=shm:/some/dir same, in another directory (tmpfs recommended)
+
+A multi-worker deployment then looks like
+
+    SESSION_STORE=shm FLASK_ENV=production gunicorn -w 4 --threads 8 app:app
+
+(without --preload, so every worker starts its own agent thread).
+"""
+import base64
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+SESSION_STORE = os.environ.get('SESSION_STORE', 'memory')
+SESSION_PUBLISH_INTERVAL = float(os.environ.get('SESSION_PUBLISH_INTERVAL', 0.1))  # seconds between /status snapshots
+WORKER_HEARTBEAT_INTERVAL = float(os.environ.get('WORKER_HEARTBEAT_INTERVAL', 1.0))
+WORKER_TIMEOUT = float(os.environ.get('WORKER_TIMEOUT', 5.0))  # heartbeat age after which a worker counts as gone
+WORKER_POLL_INTERVAL = 0.02  # inbox and reply polling
+FORWARD_TIMEOUT = float(os.environ.get('FORWARD_TIMEOUT', 30.0))
+
+DEFAULT_SHM_DIR = '/dev/shm/genai-workout-sessions'
+
+
+class MemoryStore:
+    """In-process dict; only one worker can see it"""
+    shared = False
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def keys(self, prefix):
+        """Names directly under `prefix/`"""
+        start = prefix.rstrip('/') + '/'
+        with self._lock:
+            return sorted({key[len(start):].split('/', 1)[0] for key in self._data if key.startswith(start)})
+
+
+class DirectoryStore:
+    """One file per key under `root`; writes are atomic renames, so readers never see half a value"""
+    shared = True
+
+    def __init__(self, root=DEFAULT_SHM_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(value)
+        os.replace(tmp, path)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def keys(self, prefix):
+        try:
+            names = os.listdir(self._path(prefix.rstrip('/')))
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+        return sorted(name for name in names if not name.endswith('.tmp'))
+
+
+def open_store(spec=SESSION_STORE):
+    if spec == 'memory':
+        return MemoryStore()
+    if spec == 'shm':
+        return DirectoryStore()
+    if spec.startswith('shm:'):
+        return DirectoryStore(spec[len('shm:'):])
+    raise ValueError(f"Unknown SESSION_STORE {spec!r} (use memory, shm or shm:/path)")
+
+
+def put_json(store, key, value):
+    store.put(key, json.dumps(value).encode())
+
+
+def get_json(store, key):
+    value = store.get(key)
+    return json.loads(value) if value is not None else None
+
+
+def encode_body(body):
+    return base64.b64encode(body).decode('ascii')
+
+
+def decode_body(body):
+    return base64.b64decode(body)
+
+
+class ForwardError(Exception):
+    """The target worker did not answer a forwarded command in time"""
+
+
+class WorkerAgent:
+    """Heartbeats this worker's load and runs commands other workers send it.
+
+    `load_fn()` returns {'sessions': int, ...}; `handler(command)` executes a
+    command dict and returns the reply dict.
+    """
+
+    def __init__(self, store, load_fn, handler):
+        self.store = store
+        self.load_fn = load_fn
+        self.handler = handler
+        self.id = f"{socket.gethostname()}-{os.getpid()}"
+        self._thread = None
+        self._cpu = (time.process_time(), time.time())
+        self.cpu_percent = 0.0
+
+    def start(self):
+        self.heartbeat()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def heartbeat(self):
+        cpu, now = time.process_time(), time.time()
+        last_cpu, last_now = self._cpu
+        if now > last_now:
+            self.cpu_percent = round((cpu - last_cpu) / (now - last_now) * 100, 1)
+        self._cpu = (cpu, now)
+        put_json(self.store, f"workers/{self.id}", {
+            'pid': os.getpid(),
+            'time': now,
+            'cpu_percent': self.cpu_percent,
+            **self.load_fn()
+        })
+
+    def live_workers(self):
+        workers = {}
+        now = time.time()
+        for worker_id in self.store.keys('workers'):
+            info = get_json(self.store, f"workers/{worker_id}")
+            if info and now - info['time'] <= WORKER_TIMEOUT:
+                workers[worker_id] = info
+            elif info:
+                self.store.delete(f"workers/{worker_id}")
+        return workers
+
+    def least_loaded(self):
+        """Worker with the fewest sessions, then the least CPU; ties stay on this worker"""
+        workers = self.live_workers()
+        if self.id not in workers:
+            workers[self.id] = {'cpu_percent': self.cpu_percent, **self.load_fn()}
+        return min(workers, key=lambda worker_id: (
+            workers[worker_id].get('sessions', 0),
+            workers[worker_id].get('cpu_percent', 0),
+            worker_id != self.id
+        ))
+
+    def send(self, worker_id, command, timeout=FORWARD_TIMEOUT):
+        """Run `command` on `worker_id` and wait for its reply"""
+        command_id = uuid.uuid4().hex
+        put_json(self.store, f"inbox/{worker_id}/{command_id}", command)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            reply = get_json(self.store, f"replies/{command_id}")
+            if reply is not None:
+                self.store.delete(f"replies/{command_id}")
+                return reply
+            time.sleep(WORKER_POLL_INTERVAL)
+        self.store.delete(f"inbox/{worker_id}/{command_id}")
+        raise ForwardError(f"Worker {worker_id} did not answer within {timeout:.0f}s")
+
+    def _run(self):
+        next_heartbeat = 0.0
+        while True:
+            if time.time() >= next_heartbeat:
+                self.heartbeat()
+                next_heartbeat = time.time() + WORKER_HEARTBEAT_INTERVAL
+            for command_id in self.store.keys(f"inbox/{self.id}"):
+                key = f"inbox/{self.id}/{command_id}"
+                command = get_json(self.store, key)
+                self.store.delete(key)
+                if command is not None:
+                    # Own thread, so a slow command (e.g. /stop saving to the backend) never delays heartbeats
+                    threading.Thread(target=self._execute, args=(command_id, command), daemon=True).start()
+            time.sleep(WORKER_POLL_INTERVAL)
+
+    def _execute(self, command_id, command):
+        try:
+            reply = self.handler(command)
+        except Exception as e:
+            print(f"❌ Forwarded command failed: {str(e)}")
+            reply = {'status': 500, 'mimetype': 'application/json', 'headers': {},
+                     'body': encode_body(json.dumps({"error": str(e)}).encode())}
+        put_json(self.store, f"replies/{command_id}", reply)
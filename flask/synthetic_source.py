@@ -0,0 +1,142 @@
+"""Synthetic capture source for running the tracker without a camera.
+
+`SyntheticCapture` has the parts of the `cv2.VideoCapture` interface that
+`capture_frames` uses (`isOpened`, `read`, `release`) and delivers frames
+at a fixed rate like a real webcam. Pose detection on rendered frames
+would find nobody, so the source also scripts the landmarks: each frame
+comes with 33 normalized landmarks for the active exercise, with the
+tracked joint swinging between that exercise's thresholds so reps, sets
+and form scoring all run as they would with a person in front of the
+camera.
+
+Select it with CAMERA_INDEX=synthetic (see `open_capture_source`).
+"""
+import math
+import os
+import time
+
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+SYNTHETIC_FPS = float(os.environ.get('SYNTHETIC_FPS', 30))
+SYNTHETIC_WIDTH = int(os.environ.get('SYNTHETIC_WIDTH', 640))
+SYNTHETIC_HEIGHT = int(os.environ.get('SYNTHETIC_HEIGHT', 480))
+SYNTHETIC_REP_SECONDS = float(os.environ.get('SYNTHETIC_REP_SECONDS', 2.5))
+
+LANDMARK_COUNT = 33
+# Landmark indices (mp.solutions.pose.PoseLandmark)
+LEFT_HIP, RIGHT_SHOULDER, RIGHT_ELBOW, RIGHT_WRIST = 23, 12, 14, 16
+RIGHT_HIP, RIGHT_KNEE, RIGHT_ANKLE = 24, 26, 28
+
+# Joint angle range (degrees) each scripted rep sweeps, covering the rep thresholds
+ANGLE_RANGES = {
+    'bicep_curl': (35, 170),
+    'squat': (85, 170),
+    'pushup': (85, 170),
+}
+
+
+class ScriptedPose:
+    """Stands in for a mediapipe Pose result"""
+
+    def __init__(self, landmarks):
+        self.pose_landmarks = landmarks
+
+
+def _place(origin, length, degrees):
+    """Point `length` away from origin at `degrees` (0 = +x, 90 = down in image coordinates)"""
+    radians = math.radians(degrees)
+    return origin[0] + length * math.cos(radians), origin[1] + length * math.sin(radians)
+
+
+def scripted_landmarks(exercise, phase):
+    """33 landmarks for `exercise` at `phase` (0..1 through one rep)"""
+    low, high = ANGLE_RANGES.get(exercise, ANGLE_RANGES['bicep_curl'])
+    # Start extended, bend to the low angle half way, return
+    angle = high - (high - low) * (0.5 - 0.5 * math.cos(2 * math.pi * phase))
+    points = [(0.5, 0.5)] * LANDMARK_COUNT
+
+    def set_point(index, point):
+        points[index] = point
+
+    if exercise == 'pushup':
+        # Horizontal body, arms bending under the shoulder
+        set_point(RIGHT_SHOULDER, (0.35, 0.55))
+        set_point(RIGHT_HIP, (0.6, 0.57))
+        set_point(LEFT_HIP, (0.6, 0.58))
+        set_point(RIGHT_KNEE, (0.72, 0.6))
+        set_point(RIGHT_ANKLE, (0.85, 0.62))
+        elbow = _place(points[RIGHT_SHOULDER], 0.12, 90 - (180 - angle) / 2)
+        set_point(RIGHT_ELBOW, elbow)
+        set_point(RIGHT_WRIST, _place(elbow, 0.12, 90 + (180 - angle) / 2))
+    else:
+        set_point(RIGHT_SHOULDER, (0.5, 0.3))
+        set_point(RIGHT_ELBOW, (0.5, 0.45))
+        set_point(RIGHT_HIP, (0.5, 0.55))
+        set_point(LEFT_HIP, (0.52, 0.55))
+        set_point(RIGHT_ANKLE, (0.5, 0.92))
+        if exercise == 'squat':
+            # Knee moves forward as it bends so hip-knee-ankle sweeps the range
+            bend = (180 - angle) / 2
+            knee = _place(points[RIGHT_ANKLE], 0.19, -90 - bend)
+            set_point(RIGHT_KNEE, knee)
+            set_point(RIGHT_HIP, _place(knee, 0.19, -90 + bend))
+            set_point(RIGHT_SHOULDER, (points[RIGHT_HIP][0], points[RIGHT_HIP][1] - 0.25))
+            set_point(RIGHT_ELBOW, (points[RIGHT_SHOULDER][0], points[RIGHT_SHOULDER][1] + 0.15))
+            set_point(RIGHT_WRIST, (points[RIGHT_ELBOW][0], points[RIGHT_ELBOW][1] + 0.12))
+            set_point(LEFT_HIP, (points[RIGHT_HIP][0] + 0.02, points[RIGHT_HIP][1]))
+        else:
+            set_point(RIGHT_KNEE, (0.5, 0.74))
+            # Forearm swings up in front of the body
+            set_point(RIGHT_WRIST, _place(points[RIGHT_ELBOW], 0.14, 90 - (180 - angle)))
+
+    landmarks = landmark_pb2.NormalizedLandmarkList()
+    for x, y in points:
+        landmarks.landmark.add(x=x, y=y, z=0.0, visibility=1.0)
+    return landmarks
+
+
+class SyntheticCapture:
+    """Fake webcam: paced frames plus scripted landmarks for the active exercise"""
+
+    def __init__(self, exercise_fn, fps=SYNTHETIC_FPS, width=SYNTHETIC_WIDTH, height=SYNTHETIC_HEIGHT,
+                 rep_seconds=SYNTHETIC_REP_SECONDS):
+        self.exercise_fn = exercise_fn  # returns the exercise currently being tracked
+        self.interval = 1.0 / fps
+        self.rep_seconds = rep_seconds
+        self.opened = True
+        self.started = time.time()
+        self.next_frame = self.started
+        self.frames = 0
+        # Static gradient background; a moving bar keeps consecutive JPEGs different
+        gradient = np.linspace(40, 200, width, dtype=np.uint8)
+        self.background = np.repeat(np.repeat(gradient[None, :, None], height, axis=0), 3, axis=2)
+        self.last_landmarks = None
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        if not self.opened:
+            return False, None
+        # Pace like a camera: block until the next frame is due
+        delay = self.next_frame - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_frame = max(self.next_frame + self.interval, time.time())
+
+        frame = self.background.copy()
+        x = self.frames * 4 % frame.shape[1]
+        frame[:, x:x + 8] = 255
+        self.frames += 1
+
+        phase = (time.time() - self.started) / self.rep_seconds % 1.0
+        self.last_landmarks = scripted_landmarks(self.exercise_fn(), phase)
+        return True, frame
+
+    def scripted_pose(self):
+        """Pose result for the frame returned by the last read()"""
+        return ScriptedPose(self.last_landmarks)
+
+    def release(self):
+        self.opened = False
@@ -0,0 +1,213 @@
+"""Per-user daily and weekly workout rollups, stored locally in SQLite.
+
+Every `/stop` sends the full per-rep detail to the Node backend, and the
+tracker itself remembered nothing between sessions. Cross-session trends
+(is this user's squat form improving, how often do high-severity injury
+risks come up) would need the backend to scan the whole history each time.
+
+`RollupStore` keeps one row per (user, exercise, period, bucket), where
+period is a calendar day or ISO week. At session end each exercise
+segment is folded into its day row and its week row with two upserts, so
+the cost does not grow with history:
+
+  sessions, reps, duration, calories
+  rep-weighted sums of each form score (divided back out on read)
+  counts of injury risks by severity
+
+Trend queries read a handful of rows and answer in well under a
+millisecond. The file is safe to share between worker processes (WAL
+mode).
+
+Users are identified by the `_id` in the Node backend's access token. With
+ACCESS_TOKEN_SECRET set (the backend's own secret), the token is verified
+locally. Otherwise the backend's /get-user confirms it once and the answer
+is cached until the token expires.
+"""
+import base64
+import collections
+import datetime
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+USER_ROLLUP_DB = os.environ.get('USER_ROLLUP_DB', 'user_rollups.db')
+ACCESS_TOKEN_SECRET = os.environ.get('ACCESS_TOKEN_SECRET', '')
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL = 900  # seconds, for tokens without an exp claim
+
+SCORE_FIELDS = ['knee_alignment', 'back_position', 'hip_alignment', 'range_of_motion', 'tempo', 'overall']
+SEVERITIES = ['low', 'medium', 'high', 'critical']
+PERIODS = ('day', 'week')
+TREND_THRESHOLD = 3.0  # overall-score points between the latest bucket and the ones before it
+
+_COUNTERS = ['sessions', 'reps', 'duration', 'calories', 'score_weight'] + \
+    [f'score_{field}' for field in SCORE_FIELDS] + [f'injury_{severity}' for severity in SEVERITIES]
+
+
+def period_bucket(period, timestamp):
+    """'2024-05-17' for day, '2024-W20' for week (ISO weeks sort as strings)"""
+    day = datetime.date.fromtimestamp(timestamp)
+    if period == 'day':
+        return day.isoformat()
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+class RollupStore:
+    def __init__(self, path=USER_ROLLUP_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        counters = ', '.join(f'{name} REAL NOT NULL DEFAULT 0' for name in _COUNTERS)
+        self._db.execute(
+            f'CREATE TABLE IF NOT EXISTS rollups (user TEXT NOT NULL, exercise TEXT NOT NULL, '
+            f'period TEXT NOT NULL, bucket TEXT NOT NULL, {counters}, '
+            f'PRIMARY KEY (user, period, exercise, bucket))'
+        )
+        self._db.commit()
+        columns = ', '.join(_COUNTERS)
+        self._upsert = (
+            f'INSERT INTO rollups (user, exercise, period, bucket, {columns}) '
+            f'VALUES (?, ?, ?, ?, {", ".join("?" for _ in _COUNTERS)}) '
+            f'ON CONFLICT (user, period, exercise, bucket) DO UPDATE SET '
+            + ', '.join(f'{name} = {name} + excluded.{name}' for name in _COUNTERS)
+        )
+
+    def record_session(self, user, summary, ended_at=None):
+        """Fold one exercise summary (the /stop shape) into its day and week rows"""
+        ended_at = ended_at or time.time()
+        reps = summary.get('total_reps', 0)
+        scores = summary.get('form_scores', {})
+        injuries = summary.get('injury_counts', {})
+        values = [1, reps, summary.get('duration', 0), summary.get('calories', 0), reps]
+        # Rep-weighted, so a 3-rep session doesn't count as much as a 30-rep one
+        values += [scores.get(field, 100) * reps for field in SCORE_FIELDS]
+        values += [injuries.get(severity, 0) for severity in SEVERITIES]
+        with self._lock:
+            for period in PERIODS:
+                self._db.execute(self._upsert, [user, summary['exercise_name'], period,
+                                                period_bucket(period, ended_at)] + values)
+            self._db.commit()
+
+    def trend(self, user, period='week', exercise=None, limit=8):
+        """Latest `limit` buckets, oldest first, with averaged scores and injury counts"""
+        sums = ', '.join(f'SUM({name})' for name in _COUNTERS)
+        query = f'SELECT bucket, {sums} FROM rollups WHERE user = ? AND period = ?'
+        params = [user, period]
+        if exercise:
+            query += ' AND exercise = ?'
+            params.append(exercise)
+        query += ' GROUP BY bucket ORDER BY bucket DESC LIMIT ?'
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+
+        buckets = []
+        for row in reversed(rows):
+            totals = dict(zip(_COUNTERS, row[1:]))
+            weight = totals['score_weight']
+            buckets.append({
+                "bucket": row[0],
+                "sessions": int(totals['sessions']),
+                "reps": int(totals['reps']),
+                "duration": int(totals['duration']),
+                "calories": round(totals['calories'], 1),
+                "form_scores": {
+                    field: round(totals[f'score_{field}'] / weight, 1) if weight else None
+                    for field in SCORE_FIELDS
+                },
+                "injury_risks": {severity: int(totals[f'injury_{severity}']) for severity in SEVERITIES},
+                "injury_risks_per_100_reps": round(
+                    sum(totals[f'injury_{severity}'] for severity in SEVERITIES) * 100 / totals['reps'], 1
+                ) if totals['reps'] else 0
+            })
+        return buckets
+
+    def form_trend(self, user, exercise=None, period='week'):
+        """improving / declining when the latest bucket's overall score moved past TREND_THRESHOLD"""
+        scored = [bucket['form_scores']['overall'] for bucket in self.trend(user, period, exercise, limit=5)
+                  if bucket['form_scores']['overall'] is not None]
+        if len(scored) < 2:
+            return 'stable'
+        earlier = sum(scored[:-1]) / len(scored[:-1])
+        if scored[-1] - earlier > TREND_THRESHOLD:
+            return 'improving'
+        if earlier - scored[-1] > TREND_THRESHOLD:
+            return 'declining'
+        return 'stable'
+
+
+def _b64decode(segment):
+    return base64.urlsafe_b64decode(segment + '=' * (-len(segment) % 4))
+
+
+def _token_claims(token, verify):
+    """Claims of an HS256 JWT; None if malformed, expired or (when verifying) badly signed"""
+    try:
+        header, payload, signature = token.split('.')
+        claims = json.loads(_b64decode(payload))
+        if verify:
+            expected = hmac.new(ACCESS_TOKEN_SECRET.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+            header = json.loads(_b64decode(header))
+            if not isinstance(header, dict) or header.get('alg') != 'HS256' or \
+                    not hmac.compare_digest(expected, _b64decode(signature)):
+                return None
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(claims, dict):
+        return None
+    exp = claims.get('exp')
+    if exp is not None and (isinstance(exp, bool) or not isinstance(exp, (int, float))):
+        return None
+    if exp and exp < time.time():
+        return None
+    return claims
+
+
+class UserResolver:
+    """Authorization header -> backend user id"""
+
+    def __init__(self, backend_url):
+        self.backend_url = backend_url
+        self._cache = collections.OrderedDict()  # token hash -> (user id, valid until)
+        self._lock = threading.Lock()
+
+    def user_id(self, auth_header):
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return None
+        token = auth_header[len('Bearer '):].strip()
+        if ACCESS_TOKEN_SECRET:
+            claims = _token_claims(token, verify=True)
+            return claims.get('_id') if claims else None
+
+        key = hashlib.sha256(token.encode()).hexdigest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[1] > time.time():
+                self._cache.move_to_end(key)
+                return cached[0]
+
+        claims = _token_claims(token, verify=False)
+        if claims is None:
+            return None
+        try:
+            response = requests.get(f"{self.backend_url}/get-user", headers={'Authorization': auth_header}, timeout=5)
+        except Exception as e:
+            print(f"❌ Could not verify user with backend: {str(e)}")
+            return None
+        if response.status_code != 200:
+            return None
+        user_id = (response.json().get('data') or {}).get('_id')
+        if user_id:
+            with self._lock:
+                self._cache[key] = (user_id, claims.get('exp') or time.time() + USER_CACHE_TTL)
+                while len(self._cache) > USER_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        return user_id
@@ -0,0 +1,201 @@
+"""Adaptive per-viewer JPEG quality for /video_feed.
+
+The capture loop hands each annotated frame to a `FrameLadder` once. The
+ladder holds a few renditions (rungs) of decreasing size and quality, and
+each rung is JPEG-encoded at most once per frame, lazily, by the first
+viewer that needs it. The rest of that rung's viewers reuse the bytes, so
+encode cost is bounded by the number of rungs, not viewers, and a rung
+nobody watches costs nothing.
+
+Each viewer gets a `ViewerPacer`. It measures how fast the viewer drains
+frames: a `yield` in the MJPEG generator returns once the chunk has been
+written to the socket, so a slow link shows up as slow writes (the
+socket's send buffer is kept small so that happens within a few frames
+rather than after seconds of queued video). The pacer
+picks the best rung that fits the measured throughput at the current frame
+rate. It steps down as soon as the viewer falls behind and has to skip
+frames, and steps back up only after a run of frames with room to spare.
+Viewers always get the newest frame, so a slow viewer skips frames instead
+of building up lag.
+
+Ladder rungs are `scale:quality` pairs, e.g.
+
+    VIDEO_LADDER="1.0:80,0.75:70,0.5:60,0.33:50"
+"""
+import itertools
+import os
+import socket
+import threading
+import time
+
+import cv2
+
+VIDEO_LADDER = os.environ.get('VIDEO_LADDER', '1.0:80,0.75:70,0.5:60,0.33:50')
+VIDEO_HEADROOM = float(os.environ.get('VIDEO_HEADROOM', 0.8))  # share of measured throughput a rung may use
+VIDEO_STEP_UP_FRAMES = int(os.environ.get('VIDEO_STEP_UP_FRAMES', 30))  # good frames before trying a better rung
+VIDEO_SEND_BUFFER = int(os.environ.get('VIDEO_SEND_BUFFER', 65536))  # per-viewer socket send buffer, 0 keeps the OS default
+THROUGHPUT_SMOOTHING = 0.3  # EMA weight of the newest throughput sample
+MIN_SEND_SECONDS = 1e-4  # writes that only fill the socket buffer look instant
+
+
+def parse_ladder(spec):
+    """"scale:quality,..." -> [(scale, quality)], best rung first"""
+    rungs = []
+    for entry in spec.split(','):
+        if not entry.strip():
+            continue
+        scale, _, quality = entry.partition(':')
+        rungs.append((float(scale), int(quality or 80)))
+    if not rungs:
+        raise ValueError("VIDEO_LADDER needs at least one scale:quality rung")
+    return sorted(rungs, key=lambda rung: (-rung[0], -rung[1]))
+
+
+def limit_send_buffer(environ, size=VIDEO_SEND_BUFFER):
+    """Cap the viewer connection's kernel send buffer (Werkzeug and gunicorn expose the socket)"""
+    connection = environ.get('werkzeug.socket') or environ.get('gunicorn.socket')
+    if connection is None or not size:
+        return
+    try:
+        connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, size)
+    except OSError:
+        pass
+
+
+class FrameLadder:
+    """Latest frame of one capture session plus its lazily encoded renditions"""
+
+    def __init__(self, rungs=None):
+        self.rungs = rungs or parse_ladder(VIDEO_LADDER)
+        self.condition = threading.Condition()
+        self.seq = 0
+        self.frame = None
+        self.closed = False
+        self.fps = 0.0
+        self._last_publish = None
+        self._encoded = [(0, None)] * len(self.rungs)  # (seq, jpeg) per rung
+        self._locks = [threading.Lock() for _ in self.rungs]
+        self.encodes = [0] * len(self.rungs)
+        self.frame_bytes = [0.0] * len(self.rungs)  # average JPEG size per rung
+        self.viewers = {}  # viewer id -> rung
+        self._viewer_ids = itertools.count(1)
+
+    def publish(self, frame):
+        """Capture thread: make `frame` (BGR) the newest frame and wake the viewers"""
+        now = time.perf_counter()
+        with self.condition:
+            if self._last_publish is not None and now > self._last_publish:
+                rate = 1 / (now - self._last_publish)
+                self.fps = self.fps + 0.1 * (rate - self.fps) if self.fps else rate
+            self._last_publish = now
+            self.frame = frame
+            self.seq += 1
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def wait(self, last_seq, timeout=1.0):
+        """(seq, frame) of a frame newer than `last_seq`; blocks instead of spinning"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.seq != last_seq or self.closed, timeout)
+            return self.seq, self.frame
+
+    def jpeg(self, rung, seq, frame):
+        """(seq, JPEG) of `frame` at `rung`, encoded once per frame however many viewers ask.
+
+        A viewer still holding an older frame than the rung's cached one gets
+        the newer encoding (and its seq) rather than overwriting it.
+        """
+        with self._locks[rung]:
+            cached_seq, cached = self._encoded[rung]
+            if cached_seq >= seq:
+                return cached_seq, cached
+            scale, quality = self.rungs[rung]
+            if scale < 1.0:
+                frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            data = buffer.tobytes()
+            self._encoded[rung] = (seq, data)
+            self.encodes[rung] += 1
+            count = self.encodes[rung]
+            self.frame_bytes[rung] += (len(data) - self.frame_bytes[rung]) / min(count, 30)
+            return seq, data
+
+    def estimated_bytes(self, rung):
+        """Average frame size at `rung`; rungs not encoded yet are guessed from encoded ones"""
+        if self.encodes[rung]:
+            return self.frame_bytes[rung]
+        known = [(self.frame_bytes[i], self.rungs[i]) for i in range(len(self.rungs)) if self.encodes[i]]
+        if not known:
+            return 0.0
+        size, (scale, quality) = known[0]
+        target_scale, target_quality = self.rungs[rung]
+        # JPEG size grows roughly with pixel count and, more gently, with quality
+        return size * (target_scale / scale) ** 2 * (target_quality / quality)
+
+    def add_viewer(self, rung):
+        viewer_id = next(self._viewer_ids)
+        self.viewers[viewer_id] = rung
+        return viewer_id
+
+    def remove_viewer(self, viewer_id):
+        self.viewers.pop(viewer_id, None)
+
+    def stats(self):
+        viewers = list(self.viewers.values())
+        return {
+            "fps": round(self.fps, 1),
+            "viewers": len(viewers),
+            "rungs": [
+                {
+                    "scale": scale,
+                    "quality": quality,
+                    "viewers": viewers.count(rung),
+                    "encodes": self.encodes[rung],
+                    "avg_kb": round(self.frame_bytes[rung] / 1024, 1)
+                }
+                for rung, (scale, quality) in enumerate(self.rungs)
+            ]
+        }
+
+
+class ViewerPacer:
+    """Picks one viewer's rung from how fast it drains frames"""
+
+    def __init__(self, ladder, rung=None):
+        self.ladder = ladder
+        self.fixed = rung is not None
+        self.rung = max(0, min(rung, len(ladder.rungs) - 1)) if self.fixed else len(ladder.rungs) // 2
+        self.throughput = None  # bytes/s the viewer drains
+        self.good_frames = 0
+        self.id = ladder.add_viewer(self.rung)
+
+    def record(self, size, send_seconds, skipped):
+        """After each frame: its size, how long the write took, frames skipped before it"""
+        sample = size / max(send_seconds, MIN_SEND_SECONDS)
+        if self.throughput is None:
+            self.throughput = sample
+        else:
+            self.throughput += THROUGHPUT_SMOOTHING * (sample - self.throughput)
+        if self.fixed:
+            return
+
+        budget = self.throughput * VIDEO_HEADROOM / max(self.ladder.fps, 1.0)  # bytes per frame
+        last = len(self.ladder.rungs) - 1
+        if self.rung < last and (skipped or self.ladder.estimated_bytes(self.rung) > budget):
+            self.rung += 1
+            self.good_frames = 0
+        elif self.rung > 0 and self.ladder.estimated_bytes(self.rung - 1) <= budget:
+            self.good_frames += 1
+            if self.good_frames >= VIDEO_STEP_UP_FRAMES:
+                self.rung -= 1
+                self.good_frames = 0
+        else:
+            self.good_frames = 0
+        self.ladder.viewers[self.id] = self.rung
+
+    def close(self):
+        self.ladder.remove_viewer(self.id)